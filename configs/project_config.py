@@ -19,6 +19,13 @@ class ProjectConfig(object):
     CHUNK_SIZE = 512
     CHUNK_OVERLAP = 20
 
+    # Retrieval settings for filling {context} and {context_same_SICH}
+    CONTEXT_QUERY = "business description, management discussion and analysis, investments and competition"
+    CONTEXT_K = 10
+
+    # Number of vectors used to train quantizers for local compressed copies
+    QUANTIZATION_SAMPLE_SIZE = 100000
+
     # LangChain integration settings
     LANGCHAIN_TRACING_V2 = "true"
     LANGCHAIN_ENDPOINT = "https://api.smith.langchain.com"
@@ -25,6 +25,45 @@ class SystemConfig(object):
     PINECONE_REGION = "us-east-1"
     PINECONE_NAMESPACE = "patents"
 
+    # Namespace partitioning: "none" (single namespace), "sich" (one namespace
+    # per SICH code) or "year" (one namespace per block of years).
+    # PINECONE_NAMESPACE becomes the prefix of the partition namespaces.
+    PARTITION_STRATEGY = "none"
+    PARTITION_SICH_DIGITS = 4
+    PARTITION_YEAR_SPAN = 5
+    # Metadata keys holding the year, tried in order ("date" for reports,
+    # "filing_year" for patents).
+    PARTITION_YEAR_FIELDS = ["date", "filing_year"]
+    # Seconds the list of partition namespaces is cached before it is fetched
+    # again (picks up partitions created by ingestion workers on other hosts)
+    NAMESPACE_CACHE_SECONDS = 60
+
+    # Remote patent data. Paths may contain glob patterns in the file name,
+    # e.g. "/data/patents/USPTO-patent_level-metrics-*.pqt.gzip".
+    # DATA_BACKEND is "dropbox", or "local" to read LOCAL_DATA_DIRECTORY instead.
+    DATA_BACKEND = "dropbox"
+    DROPBOX_ACCESS_TOKEN = os.getenv("DROPBOX_ACCESS_TOKEN", "YOUR-DROPBOX-ACCESS-TOKEN")
+    LOCAL_DATA_DIRECTORY = "data"
+    PATENT_DATA_PATHS = ["/data/patents/USPTO-patent_level-metrics-76_20.pqt.gzip"]
+    DOWNLOAD_CACHE_DIRECTORY = os.getenv("DOWNLOAD_CACHE_DIRECTORY", "cache/downloads")
+    DOWNLOAD_WORKERS = 4
+    # Record of files already ingested (index name and content hash per line)
+    INGESTED_FILES_PATH = os.getenv("INGESTED_FILES_PATH", "cache/ingested_files.txt")
+
+    # SQLite file caching retrieved prompt contexts per firm-year. Ingestion
+    # workers invalidate entries in this same file, so they must run on the
+    # host that serves queries and use the same path.
+    CONTEXT_CACHE_PATH = os.getenv("CONTEXT_CACHE_PATH", "cache/context_cache.sqlite")
+    # Seconds after an upsert during which contexts for the affected firms and
+    # industries are not cached (Pinecone serverless reads are eventually consistent)
+    CONTEXT_CACHE_FRESHNESS_SECONDS = 300
+
+    # SQLite work queue shared by ingestion workers. Workers must all run on one
+    # host with this file on a local disk: SQLite locking over NFS/SMB is not
+    # reliable and two workers could lease the same shard.
+    INGESTION_QUEUE_PATH = os.getenv("INGESTION_QUEUE_PATH", "cache/ingestion_queue.sqlite")
+    INGESTION_LEASE_SECONDS = 300
+
     @classmethod
     def load_from_env(cls):
         """
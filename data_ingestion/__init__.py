@@ -2,10 +2,25 @@
 data_ingestion package.
 
 Provides classes and functions for loading, cleaning, and extracting metadata
-from CSV and JSON reports.
+from CSV and JSON reports and patent parquet files, sharded multi-worker
+ingestion through a lease-based work queue, and concurrent remote fetching
+into a content-addressed download cache.
 """
 
-__all__ = ["CSVLoader", "DataCleaner", "MetadataExtractor", "ReportLoader"]
+__all__ = [
+    "CSVLoader",
+    "DataCleaner",
+    "MetadataExtractor",
+    "ReportLoader",
+    "PatentLoader",
+    "LeaseQueue",
+    "IngestionWorker",
+    "RemoteFetcher",
+    "DropboxBackend",
+    "LocalDirectoryBackend",
+    "DownloadCache",
+    "IngestionRecord",
+]
 
 # Re-export the main classes/functions so users can do:
 #   from data_ingestion import CSVLoader
@@ -16,3 +31,7 @@ from .csv_loader import CSVLoader
 from .data_cleaner import DataCleaner
 from .metadata_extractor import MetadataExtractor
 from .report_loader import ReportLoader
+from .patent_loader import PatentLoader
+from .work_queue import LeaseQueue
+from .sharded_ingestion import IngestionWorker
+from .remote_fetch import RemoteFetcher, DropboxBackend, LocalDirectoryBackend, DownloadCache, IngestionRecord
@@ -0,0 +1,78 @@
+"""
+patent_loader.py
+
+Loads USPTO patent-level metric files (parquet) and converts each patent into
+a Document whose text is the claim text, with gvkey and filing year as metadata.
+"""
+
+import pyarrow.parquet as pq
+
+# LangChain-specific import
+from langchain.schema import Document
+
+
+class PatentLoader(object):
+    """
+    Reads patent parquet files, either whole or one row group at a time, and
+    builds Document objects from the rows.
+    """
+
+    COLUMNS = ['gvkey', 'filing_year', 'claim_text', 'patent_abstract', 'patent_title']
+
+    @staticmethod
+    def num_row_groups(file_path):
+        """
+        Args:
+            file_path (str): Path to a parquet file.
+
+        Returns:
+            int: Number of row groups in the file.
+        """
+        return pq.ParquetFile(file_path).metadata.num_row_groups
+
+    @classmethod
+    def load_dataframe(cls, source, row_group=None):
+        """
+        Reads the patent columns from a parquet file.
+
+        Args:
+            source: Path or file-like object of the parquet file.
+            row_group (int, optional): Only read this row group.
+
+        Returns:
+            pandas.DataFrame
+        """
+        parquet_file = pq.ParquetFile(source)
+        if row_group is None:
+            table = parquet_file.read(columns=cls.COLUMNS)
+        else:
+            table = parquet_file.read_row_group(row_group, columns=cls.COLUMNS)
+        return table.to_pandas()
+
+    @staticmethod
+    def dataframe_to_documents(df):
+        """
+        Converts each row into a document format expected by the embedding pipeline.
+        Here, claim_text is the text to embed, while gvkey and filing_year are set as metadata.
+
+        Args:
+            df (pandas.DataFrame): Frame with the columns in PatentLoader.COLUMNS.
+
+        Returns:
+            list: A list of LangChain `Document` objects.
+        """
+        df = df.dropna(subset=['claim_text'])
+
+        documents = []
+        for _, row in df.iterrows():
+            doc = Document(
+                page_content=row['claim_text'],
+                metadata={
+                    "gvkey": row['gvkey'],
+                    "filing_year": row['filing_year'],
+                    'patent_abstract': row['patent_abstract'],
+                    'patent_title': row['patent_title']
+                }
+            )
+            documents.append(doc)
+        return documents
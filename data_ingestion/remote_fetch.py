@@ -0,0 +1,397 @@
+"""
+remote_fetch.py
+
+Concurrent download of remote data files into a local content-addressed cache.
+
+Remote paths (or glob patterns) are resolved by a backend, downloaded with
+bounded parallelism and stored under their Dropbox-style content hash, so a
+file whose content has not changed is never downloaded again. Files are
+yielded as soon as each download finishes, letting the caller parse one file
+while the others are still in flight.
+"""
+
+import os
+import fnmatch
+import hashlib
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import dropbox
+
+# Dropbox hashes content in 4 MiB blocks.
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class ContentHasher(object):
+    """
+    Incremental implementation of the Dropbox content_hash: the SHA-256 of the
+    concatenated SHA-256 digests of each 4 MiB block.
+    """
+
+    def __init__(self):
+        self._overall = hashlib.sha256()
+        self._block = hashlib.sha256()
+        self._block_pos = 0
+
+    def update(self, data):
+        pos = 0
+        while pos < len(data):
+            if self._block_pos == HASH_BLOCK_SIZE:
+                self._overall.update(self._block.digest())
+                self._block = hashlib.sha256()
+                self._block_pos = 0
+            part = data[pos:pos + HASH_BLOCK_SIZE - self._block_pos]
+            self._block.update(part)
+            self._block_pos += len(part)
+            pos += len(part)
+
+    def hexdigest(self):
+        overall = self._overall.copy()
+        if self._block_pos > 0:
+            overall.update(self._block.digest())
+        return overall.hexdigest()
+
+
+def file_content_hash(file_path):
+    """
+    Computes the Dropbox content_hash of a local file.
+    """
+    hasher = ContentHasher()
+    with open(file_path, "rb") as f:
+        while True:
+            data = f.read(DOWNLOAD_CHUNK_SIZE)
+            if not data:
+                break
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+def _has_magic(pattern):
+    return any(c in pattern for c in "*?[")
+
+
+class RemoteFile(object):
+    """
+    A file resolved by a backend: its remote path, size and content hash.
+    """
+
+    def __init__(self, path, size, content_hash):
+        self.path = path
+        self.size = size
+        self.content_hash = content_hash
+
+    @property
+    def name(self):
+        return self.path.rstrip("/").split("/")[-1]
+
+
+class DropboxBackend(object):
+    """
+    Lists and streams files from Dropbox.
+    """
+
+    def __init__(self, access_token):
+        """
+        Args:
+            access_token (str): Dropbox API access token.
+        """
+        self.dbx = dropbox.Dropbox(access_token)
+
+    def list(self, pattern):
+        """
+        Resolves a path or glob pattern (e.g. "/data/patents/*.pqt.gzip").
+        Wildcards are only supported in the final path component.
+
+        Returns:
+            list: RemoteFile entries.
+        """
+        if not _has_magic(pattern):
+            metadata = self.dbx.files_get_metadata(pattern)
+            return [RemoteFile(metadata.path_display, metadata.size, metadata.content_hash)]
+
+        folder, name_pattern = pattern.rsplit("/", 1)
+        result = self.dbx.files_list_folder(folder)
+        entries = list(result.entries)
+        while result.has_more:
+            result = self.dbx.files_list_folder_continue(result.cursor)
+            entries.extend(result.entries)
+
+        files = []
+        for entry in entries:
+            if isinstance(entry, dropbox.files.FileMetadata) and fnmatch.fnmatch(entry.name, name_pattern):
+                files.append(RemoteFile(entry.path_display, entry.size, entry.content_hash))
+        return files
+
+    def download(self, remote_file, out):
+        """
+        Streams a file into the open binary file object `out`.
+        """
+        _, response = self.dbx.files_download(remote_file.path)
+        try:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                out.write(chunk)
+        finally:
+            response.close()
+
+
+class LocalDirectoryBackend(object):
+    """
+    Serves files from a local directory through the same interface as
+    DropboxBackend. Remote paths are interpreted relative to `root`.
+    """
+
+    def __init__(self, root):
+        """
+        Args:
+            root (str): Directory standing in for the Dropbox root.
+        """
+        self.root = root
+
+    def _local_path(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def list(self, pattern):
+        """
+        Resolves a path or glob pattern relative to `root`.
+
+        Returns:
+            list: RemoteFile entries.
+        """
+        folder, name_pattern = ("/" + pattern.lstrip("/")).rsplit("/", 1)
+        local_folder = self._local_path(folder)
+        if not os.path.isdir(local_folder):
+            return []
+
+        files = []
+        for name in sorted(os.listdir(local_folder)):
+            local_path = os.path.join(local_folder, name)
+            if os.path.isfile(local_path) and fnmatch.fnmatch(name, name_pattern):
+                files.append(RemoteFile(
+                    folder + "/" + name, os.path.getsize(local_path), file_content_hash(local_path)))
+        return files
+
+    def download(self, remote_file, out):
+        """
+        Copies a file into the open binary file object `out`.
+        """
+        with open(self._local_path(remote_file.path), "rb") as f:
+            shutil.copyfileobj(f, out, DOWNLOAD_CHUNK_SIZE)
+
+
+class DownloadCache(object):
+    """
+    Local cache storing each file under its content hash. Downloads are
+    written to a temporary file, verified against the expected hash and then
+    atomically renamed into place, so a partial or corrupt download is never
+    mistaken for a cached file.
+    """
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): Cache directory. Created if missing.
+        """
+        self.directory = directory
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    def path_for(self, remote_file):
+        """
+        Returns the cache path of a remote file (hash plus original name, so
+        the file extension is preserved for parsers).
+        """
+        return os.path.join(self.directory, remote_file.content_hash + "-" + remote_file.name)
+
+    def contains(self, remote_file):
+        return os.path.exists(self.path_for(remote_file))
+
+    def store(self, remote_file, backend):
+        """
+        Downloads a remote file into the cache unless it is already present.
+
+        Args:
+            remote_file (RemoteFile): File to fetch.
+            backend: DropboxBackend or LocalDirectoryBackend.
+
+        Returns:
+            tuple: (local path, whether a download happened).
+        """
+        target = self.path_for(remote_file)
+        if os.path.exists(target):
+            return target, False
+
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                hashing_out = _HashingWriter(out)
+                backend.download(remote_file, hashing_out)
+            actual = hashing_out.hasher.hexdigest()
+            if actual != remote_file.content_hash:
+                raise ValueError(
+                    "Content hash mismatch for " + remote_file.path
+                    + ": expected " + remote_file.content_hash + ", got " + actual)
+            os.replace(temp_path, target)
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return target, True
+
+
+class _HashingWriter(object):
+    """
+    File wrapper that hashes bytes as they are written.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.hasher = ContentHasher()
+
+    def write(self, data):
+        self.hasher.update(data)
+        return self.out.write(data)
+
+
+class IngestionRecord(object):
+    """
+    Append-only text file of the keys (e.g. index name and content hash) of
+    files that have been fully ingested, so unchanged files can be skipped on
+    later runs.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path to the record file. Created on the first add().
+        """
+        self.path = path
+        self.keys = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.keys = set(line.strip() for line in f if line.strip())
+
+    def contains(self, key):
+        return key in self.keys
+
+    def add(self, key):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(self.path, "a") as f:
+            f.write(key + "\n")
+        self.keys.add(key)
+
+
+class RemoteFetcher(object):
+    """
+    Resolves remote paths or glob patterns and downloads the matching files
+    concurrently into a DownloadCache.
+    """
+
+    def __init__(self, backend, cache, max_workers=4):
+        """
+        Args:
+            backend: DropboxBackend or LocalDirectoryBackend.
+            cache (DownloadCache): Local content-addressed cache.
+            max_workers (int): Maximum number of concurrent downloads.
+        """
+        self.backend = backend
+        self.cache = cache
+        self.max_workers = max_workers
+
+    def resolve(self, patterns):
+        """
+        Expands paths/glob patterns into a de-duplicated list of RemoteFiles.
+        """
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        files = []
+        seen = set()
+        for pattern in patterns:
+            for remote_file in self.backend.list(pattern):
+                if remote_file.path not in seen:
+                    seen.add(remote_file.path)
+                    files.append(remote_file)
+        return files
+
+    def iter_fetch(self, patterns, skip=None):
+        """
+        Downloads every matching file and yields each one as soon as it is
+        available locally. Missing files start downloading before cached files
+        are yielded, so downloads overlap with the caller's processing of the
+        cached ones.
+
+        Args:
+            patterns (str or list): Remote paths or glob patterns.
+            skip (callable, optional): Called with each RemoteFile; files for
+                which it returns True are neither downloaded nor yielded
+                (e.g. files already ingested).
+
+        Yields:
+            tuple: (RemoteFile, local path).
+
+        Raises:
+            RuntimeError: After all other files have been yielded, if any
+                download failed or did not match its content hash.
+        """
+        files = self.resolve(patterns)
+        print("Resolved " + str(len(files)) + " remote files.")
+        if skip is not None:
+            remaining = [f for f in files if not skip(f)]
+            if len(remaining) < len(files):
+                print("Skipping " + str(len(files) - len(remaining)) + " unchanged files.")
+            files = remaining
+
+        cached = []
+        pending = []
+        for remote_file in files:
+            if self.cache.contains(remote_file):
+                cached.append(remote_file)
+            else:
+                pending.append(remote_file)
+
+        failures = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            for remote_file in pending:
+                futures[executor.submit(self.cache.store, remote_file, self.backend)] = remote_file
+
+            for remote_file in cached:
+                print("Cache hit for " + remote_file.path)
+                yield remote_file, self.cache.path_for(remote_file)
+
+            for future in as_completed(futures):
+                remote_file = futures[future]
+                try:
+                    local_path, _ = future.result()
+                except Exception as e:
+                    print("Failed to download " + remote_file.path + ": " + str(e))
+                    failures.append(remote_file.path + ": " + str(e))
+                    continue
+                print("Downloaded " + remote_file.path + " (" + str(remote_file.size) + " bytes)")
+                yield remote_file, local_path
+
+        if failures:
+            raise RuntimeError(
+                str(len(failures)) + " of " + str(len(files)) + " files could not be fetched:\n"
+                + "\n".join(failures))
+
+    def fetch(self, patterns, on_file=None, skip=None):
+        """
+        Downloads every matching file, calling `on_file(remote_file, local_path)`
+        as each one lands. `skip` is passed to iter_fetch().
+
+        Returns:
+            list: Local paths of all fetched files.
+
+        Raises:
+            RuntimeError: If any download failed (raised after the others finish).
+        """
+        paths = []
+        for remote_file, local_path in self.iter_fetch(patterns, skip=skip):
+            if on_file is not None:
+                on_file(remote_file, local_path)
+            paths.append(local_path)
+        return paths
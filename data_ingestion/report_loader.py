@@ -133,10 +133,23 @@ class ReportLoader(object):
         Returns:
             list: List of Document objects with optional section filtering.
         """
-        all_documents = []
         file_paths = self.list_json_reports()
         print("Found " + str(len(file_paths)) + " JSON files in " + self.reports_directory)
+        return self.load_documents_from_files(file_paths, desired_sections)
+
+    def load_documents_from_files(self, file_paths, desired_sections=None):
+        """
+        Loads the given .json files and returns a combined list of Documents.
+        Optionally filters only the desired sections (e.g., ["Item 1", "Item 7"]).
 
+        Args:
+            file_paths (list): Paths to .json report files.
+            desired_sections (list): A list of section titles to keep. If None, all sections are kept.
+
+        Returns:
+            list: List of Document objects with optional section filtering.
+        """
+        all_documents = []
         idx = 0
         for file_path in file_paths:
             idx += 1
@@ -0,0 +1,245 @@
+"""
+sharded_ingestion.py
+
+Splits ingestion into shards and processes them with any number of workers
+coordinated through a LeaseQueue.
+
+Shards are either parquet row groups (patent files) or buckets of 10-K report
+files hashed by CIK. Shard IDs are derived from file contents, so different
+trees, or a tree that gained new filings, produce new shards instead of being
+silently skipped. Chunk IDs are derived from the content as well (per parquet
+file/row group, or per report accession and section), so a shard that is
+reassigned after a lease expires overwrites its earlier vectors instead of
+duplicating them.
+"""
+
+import os
+import time
+import zlib
+import hashlib
+import threading
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from configs.config import Config
+from data_ingestion.metadata_extractor import MetadataExtractor
+from data_ingestion.patent_loader import PatentLoader
+from data_ingestion.report_loader import ReportLoader
+from data_ingestion.remote_fetch import file_content_hash
+
+
+def stable_bucket(key, num_shards):
+    """
+    Maps a key (CIK or gvkey) to a shard number that is identical across
+    processes and hosts, unlike the built-in hash().
+    """
+    return zlib.crc32(str(key).encode("utf-8")) % num_shards
+
+
+def parquet_row_group_shards(file_paths):
+    """
+    Builds one shard per parquet row group.
+
+    Args:
+        file_paths (list): Paths to parquet files visible to every worker.
+
+    Returns:
+        list: Shard dicts.
+    """
+    shards = []
+    for file_path in file_paths:
+        # The content hash keeps same-named files in different directories apart.
+        content_hash = file_content_hash(file_path)[:16]
+        for row_group in range(PatentLoader.num_row_groups(file_path)):
+            shards.append({
+                "shard_id": "parquet:" + os.path.basename(file_path) + ":" + content_hash
+                            + ":" + str(row_group),
+                "kind": "parquet",
+                "path": file_path,
+                "row_group": row_group
+            })
+    return shards
+
+
+def report_file_shards(reports_directory, num_shards):
+    """
+    Buckets JSON reports by CIK so that all filings of a company land in the
+    same shard.
+
+    Args:
+        reports_directory (str): Directory scanned by ReportLoader.
+        num_shards (int): Number of buckets.
+
+    Returns:
+        list: Shard dicts (empty buckets are skipped).
+    """
+    buckets = {}
+    for file_path in ReportLoader(reports_directory).list_json_reports():
+        try:
+            cik = MetadataExtractor.extract_from_filename(os.path.basename(file_path))["cik"]
+        except ValueError as e:
+            print("Metadata extraction error:", str(e))
+            continue
+        buckets.setdefault(stable_bucket(cik, num_shards), []).append(file_path)
+
+    shards = []
+    for bucket in sorted(buckets):
+        # Identify the bucket by its files and their contents, so another tree or
+        # newly added filings yield a new shard rather than colliding with an old one.
+        digest = hashlib.sha256()
+        for file_path in sorted(buckets[bucket]):
+            digest.update(os.path.basename(file_path).encode("utf-8"))
+            digest.update(file_content_hash(file_path).encode("utf-8"))
+        shards.append({
+            "shard_id": "reports:" + str(bucket) + "/" + str(num_shards) + ":" + digest.hexdigest()[:16],
+            "kind": "reports",
+            "files": sorted(buckets[bucket])
+        })
+    return shards
+
+
+class IngestionWorker(object):
+    """
+    Repeatedly leases a shard, loads and splits its documents, upserts them
+    into the vector store and marks the shard done. A background thread keeps
+    the lease alive while the shard is being processed.
+    """
+
+    def __init__(
+            self,
+            queue,
+            vs_manager,
+            worker_id=None,
+            lease_seconds=300,
+            poll_seconds=5,
+            cik_to_sich=None,
+            desired_sections=None
+    ):
+        """
+        Args:
+            queue (LeaseQueue): Shared work queue.
+            vs_manager: Object exposing upsert_documents(documents, ids=None),
+                normally a loaded VectorStoreManager.
+            worker_id (str): Unique worker name. Defaults to "<hostname>-<pid>".
+            lease_seconds (float): Lease duration; heartbeats run at a third of it.
+            poll_seconds (float): Wait between polls while other workers hold leases.
+            cik_to_sich (dict, optional): CIK -> {"sich", "conm"} mapping for reports.
+            desired_sections (list, optional): Report sections to keep.
+        """
+        self.queue = queue
+        self.vs_manager = vs_manager
+        if worker_id is None:
+            worker_id = os.uname()[1] + "-" + str(os.getpid())
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.cik_to_sich = cik_to_sich
+        self.desired_sections = desired_sections
+
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=Config.Project.CHUNK_SIZE,
+            chunk_overlap=Config.Project.CHUNK_OVERLAP,
+            length_function=len
+        )
+
+    def load_shard_documents(self, shard):
+        """
+        Loads the (unsplit) documents belonging to a shard.
+        """
+        if shard["kind"] == "parquet":
+            df = PatentLoader.load_dataframe(shard["path"], row_group=shard["row_group"])
+            return PatentLoader.dataframe_to_documents(df)
+        if shard["kind"] == "reports":
+            report_loader = ReportLoader(os.path.dirname(shard["files"][0]), self.cik_to_sich)
+            return report_loader.load_documents_from_files(shard["files"], self.desired_sections)
+        raise ValueError("Unknown shard kind: " + str(shard["kind"]))
+
+    @staticmethod
+    def chunk_ids(shard, split_docs):
+        """
+        Builds stable vector IDs for the chunks of a shard. Report chunks are
+        keyed by accession number and section, so the same filing always maps
+        to the same IDs whichever shard it was ingested through; parquet chunks
+        are keyed by the content-derived shard ID.
+        """
+        if shard["kind"] != "reports":
+            return [shard["shard_id"] + "#" + str(i) for i in range(len(split_docs))]
+
+        ids = []
+        counters = {}
+        for doc in split_docs:
+            key = str(doc.metadata.get("accession_number")) + "#" + str(doc.metadata.get("section_title"))
+            counters[key] = counters.get(key, -1) + 1
+            ids.append(key + "#" + str(counters[key]))
+        return ids
+
+    def _heartbeat(self, shard_id, stop_event, lost_event):
+        while not stop_event.wait(self.lease_seconds / 3.0):
+            if not self.queue.heartbeat(shard_id, self.worker_id, self.lease_seconds):
+                lost_event.set()
+                return
+
+    def process_shard(self, shard):
+        """
+        Loads, splits and upserts one shard under a heartbeat-maintained lease.
+
+        Returns:
+            int or None: Number of chunks upserted, or None if the lease was lost.
+        """
+        shard_id = shard["shard_id"]
+        stop_event = threading.Event()
+        lost_event = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(shard_id, stop_event, lost_event))
+        heartbeat.daemon = True
+        heartbeat.start()
+
+        try:
+            split_docs = self.splitter.split_documents(self.load_shard_documents(shard))
+            if lost_event.is_set():
+                print("Worker " + self.worker_id + " lost lease on " + shard_id + ", skipping upsert.")
+                return None
+            if split_docs:
+                ids = self.chunk_ids(shard, split_docs)
+                self.vs_manager.upsert_documents(split_docs, ids=ids)
+        finally:
+            stop_event.set()
+            heartbeat.join()
+
+        if not self.queue.complete(shard_id, self.worker_id):
+            print("Worker " + self.worker_id + " lost lease on " + shard_id + " before completion.")
+            return None
+        return len(split_docs)
+
+    def run(self):
+        """
+        Processes shards until the queue has nothing pending or leased.
+
+        Returns:
+            int: Number of shards this worker completed.
+        """
+        completed = 0
+        while True:
+            shard = self.queue.acquire(self.worker_id, self.lease_seconds)
+            if shard is None:
+                if self.queue.is_finished():
+                    break
+                # Other workers still hold leases; wait in case one expires.
+                time.sleep(self.poll_seconds)
+                continue
+
+            try:
+                num_chunks = self.process_shard(shard)
+            except Exception as e:
+                print("Worker " + self.worker_id + " failed on " + shard["shard_id"] + ": " + str(e))
+                self.queue.fail(shard["shard_id"], self.worker_id, e)
+                continue
+
+            if num_chunks is None:
+                continue
+            completed += 1
+            print("Worker " + self.worker_id + " finished " + shard["shard_id"]
+                  + " (" + str(num_chunks) + " chunks).")
+
+        print("Worker " + self.worker_id + " done after " + str(completed) + " shards.")
+        return completed
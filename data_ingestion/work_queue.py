@@ -0,0 +1,230 @@
+"""
+work_queue.py
+
+Lease-based work queue stored in SQLite, used to hand ingestion shards out to
+any number of worker processes on one host.
+
+Claims rely on SQLite file locking (BEGIN IMMEDIATE), which is not reliable on
+network filesystems such as NFS or SMB: two hosts could lease the same shard.
+The database must therefore live on a local disk, and LeaseQueue refuses to
+open one on a network mount.
+
+A worker leases one shard at a time and must renew the lease with heartbeats.
+If a worker dies, its lease expires and the shard is handed to another worker.
+Shards that keep failing are marked "failed" after `max_attempts` leases.
+"""
+
+import os
+import json
+import time
+import sqlite3
+
+# Filesystem types on which SQLite locking cannot be trusted.
+NETWORK_FILESYSTEMS = ("nfs", "nfs4", "cifs", "smbfs", "smb3", "9p", "fuse.sshfs", "afs", "ceph", "glusterfs")
+
+
+def filesystem_type(path):
+    """
+    Returns the filesystem type of the mount holding `path` (read from
+    /proc/mounts), or None where that is not available.
+    """
+    if not os.path.exists("/proc/mounts"):
+        return None
+    path = os.path.realpath(path)
+    best_mount = ""
+    best_type = None
+    with open("/proc/mounts") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 3:
+                continue
+            mount_point = fields[1].replace("\\040", " ")
+            prefix = mount_point.rstrip("/") + "/"
+            if (path == mount_point or path.startswith(prefix)) and len(mount_point) >= len(best_mount):
+                best_mount = mount_point
+                best_type = fields[2]
+    return best_type
+
+
+class LeaseQueue(object):
+    """
+    SQLite-backed queue of shards with per-shard leases.
+    Shard states: "pending", "leased", "done", "failed".
+    """
+
+    def __init__(self, db_path, max_attempts=3):
+        """
+        Args:
+            db_path (str): Path to the SQLite database file shared by all workers.
+                Must be on a local disk.
+            max_attempts (int): Number of leases after which a shard is marked failed.
+        """
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        fs_type = filesystem_type(directory or ".")
+        if fs_type in NETWORK_FILESYSTEMS:
+            raise ValueError(
+                "Queue database " + db_path + " is on a network filesystem (" + fs_type + "). "
+                "SQLite locking is not reliable there, so workers could lease the same shard; "
+                "run all ingestion workers on one host with the queue on a local disk.")
+
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS shards ("
+            " shard_id TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " worker_id TEXT,"
+            " lease_expires REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " updated_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS shards_status ON shards (status)")
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        # isolation_level=None lets us issue BEGIN IMMEDIATE explicitly.
+        return sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+
+    def add_shards(self, shards):
+        """
+        Enqueues shards. Shards already present (by shard_id) are left untouched,
+        so re-running the coordinator does not duplicate work.
+
+        Args:
+            shards (list): List of dicts, each with a unique "shard_id" key.
+
+        Returns:
+            int: Number of newly added shards.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        added = 0
+        for shard in shards:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO shards (shard_id, payload, updated_at) VALUES (?, ?, ?)",
+                (shard["shard_id"], json.dumps(shard), time.time())
+            )
+            added += cursor.rowcount
+        conn.execute("COMMIT")
+        conn.close()
+        return added
+
+    def acquire(self, worker_id, lease_seconds):
+        """
+        Leases the next pending shard, or a leased shard whose lease has expired.
+
+        Args:
+            worker_id (str): Identifier of the calling worker.
+            lease_seconds (float): Lease duration before the shard may be reassigned.
+
+        Returns:
+            dict or None: The shard payload, or None if nothing is available.
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT shard_id, payload, status, worker_id FROM shards"
+            " WHERE attempts < ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))"
+            " ORDER BY attempts, shard_id LIMIT 1",
+            (self.max_attempts, now)
+        ).fetchone()
+
+        if row is None:
+            # Expired leases that ran out of attempts will never be picked up again.
+            conn.execute(
+                "UPDATE shards SET status = 'failed', updated_at = ?"
+                " WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            conn.execute("COMMIT")
+            conn.close()
+            return None
+
+        shard_id, payload, status, previous_worker = row
+        conn.execute(
+            "UPDATE shards SET status = 'leased', worker_id = ?, lease_expires = ?,"
+            " attempts = attempts + 1, updated_at = ? WHERE shard_id = ?",
+            (worker_id, now + lease_seconds, now, shard_id)
+        )
+        conn.execute("COMMIT")
+        conn.close()
+
+        if status == "leased":
+            print("Reassigning expired shard " + shard_id + " from worker " + str(previous_worker))
+        return json.loads(payload)
+
+    def heartbeat(self, shard_id, worker_id, lease_seconds):
+        """
+        Extends the lease on a shard.
+
+        Returns:
+            bool: False if the worker no longer holds the lease.
+        """
+        now = time.time()
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE shards SET lease_expires = ?, updated_at = ?"
+            " WHERE shard_id = ? AND worker_id = ? AND status = 'leased'",
+            (now + lease_seconds, now, shard_id, worker_id)
+        )
+        conn.close()
+        return cursor.rowcount == 1
+
+    def complete(self, shard_id, worker_id):
+        """
+        Marks a shard as done.
+
+        Returns:
+            bool: False if the worker no longer held the lease.
+        """
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE shards SET status = 'done', error = NULL, updated_at = ?"
+            " WHERE shard_id = ? AND worker_id = ? AND status = 'leased'",
+            (time.time(), shard_id, worker_id)
+        )
+        conn.close()
+        return cursor.rowcount == 1
+
+    def fail(self, shard_id, worker_id, error):
+        """
+        Releases a shard after an error. It is retried until `max_attempts`
+        leases have been used, then marked failed.
+        """
+        conn = self._connect()
+        conn.execute(
+            "UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+            " worker_id = NULL, lease_expires = NULL, error = ?, updated_at = ?"
+            " WHERE shard_id = ? AND worker_id = ? AND status = 'leased'",
+            (self.max_attempts, str(error), time.time(), shard_id, worker_id)
+        )
+        conn.close()
+
+    def counts(self):
+        """
+        Returns:
+            dict: Number of shards per status.
+        """
+        conn = self._connect()
+        rows = conn.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall()
+        conn.close()
+        result = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        for status, count in rows:
+            result[status] = count
+        return result
+
+    def is_finished(self):
+        """
+        Returns:
+            bool: True when no shard is pending or leased.
+        """
+        counts = self.counts()
+        return counts["pending"] == 0 and counts["leased"] == 0
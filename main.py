@@ -1,29 +1,73 @@
 """
 main.py
 """
-import io
 import os
+import argparse
 import pinecone
-from pinecone import Pinecone
-import dropbox
-import pandas as pd
 
 from configs.config import Config
 from data_ingestion.csv_loader import CSVLoader
-from data_ingestion.report_loader import ReportLoader
+from data_ingestion.patent_loader import PatentLoader
+from data_ingestion.remote_fetch import (
+    RemoteFetcher, DropboxBackend, LocalDirectoryBackend, DownloadCache, IngestionRecord)
+from data_ingestion.work_queue import LeaseQueue
+from data_ingestion.sharded_ingestion import (
+    IngestionWorker, parquet_row_group_shards, report_file_shards)
 from vectorstore.vectorstore_manager import VectorStoreManager
+from vectorstore.context_cache import ContextCache
+from vectorstore.partitioning import build_partitioner
+from vectorstore import pinecone_pool
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.docstore.document import Document
-
-def load_parquet():
-    dbx = dropbox.Dropbox(
-        "sl.u.AFniKtVtgy__nqYto-V9vrO9xOW3D5952wBCzLBT0aRk_NN18avnifz4Yv8XZO-cxtPGKp1m7PlNudnT8tFKgvP-skwLLpeRO2R3LUnHG5OHWK4wIeAI5j8WyitzhWEgK10HALpxCGyjX_1FupyScavqhoFe-dV6cSj1LPodxJLQZ_MBM6_PklLQrgB_SYLa3uWuD5NTaSjl0Ej3cB_RByOMSTZuEAQm-BTHFyAItm01rQAz-zhdzdJ_nfOOJE1PaUSmoQf97RFlqaDldQQdfXQJyaTH7-KTIT1H826ky_W_vakCyGXMw6Y7G0tz11jXP_h3g9dqlvWNYYv7zZphGbW1WYaWrCQ5waOdjuWDYfvjQCNjBGu8V6vvlqJ0fDQrfs0qe89JfohH46x3bBpvVi6RObOfCJFeau0wS3p7ZYf20TvuBZbrwftxZVlBHQq70MuJgwgmMcq6rkdlns0zg8hSlpkLNotSiWVyq1FSGpHSRJTcu26-vEID2A5kxWLQjxOFzpgA377-mJ0WgT8NixQ_ssNDlyGUJ9e1M4fmv1-AgMc9yocLFmOMFr_BeC747C7Z3SQb_gsTLmyjGe4QTNJN8X44oqmblth-gh2dk3w2UExfI2rs7pLXk9IUzYgyOxhQax6X7aWsl4DLgnZGiyoxFBveDBcI50d9jjiqx5qE_msM3z2KlkM3-Xx6gOVviWusvdVBRyeY3mCLbr9sQP4FPSzM5OMkmvFanxSlwPnEN7LCV7ed0u8k-AYbgiZ_F1u46T3wYxgDygkuGY91Y6wy2SDfdzn6wOQ4JG4YB-2GhVDrxSDrZ381eVWPMdRADJ7QiLP8gRZb7KYT-spNxId96MagspaxaLCTpGRVrMGz2WjXvZyLWNz4_isPeuywG2CiwKiUHnIuugH117vtJGguxtgEUmzVb-DjdOXqMXb8NqjnnfJn4Iq-DGRAYGoCyO56qLXvAi92WOYb8fV-znSytxKR3acJRdyPpLpONWpEFnvmEGt6OMQ79rgBwsCQnfMIOQd2zuKttzZHfCg40NYS2-6yRwSbRTDAAQr3rNOLO2na-jjT8OhakG8zTFR1BDh_tOhg68j2rGljmIUS4iJpDg61gPUo6BjvpZJ5I8ZNij3PAFtH6PdWxgGilZ6P2782SKEtgGm3ATVtVrzwYXDi_04SFoiJ7BczGES9_3DpibGdlJo8D5KqUvkTkBEbLpj-USblVchyAysPmpxJ8ceru9V0PnriDyyr1QrzDvgzgoE2Yn75YNS8yOrOvwPw45mgdJFg35_8HRlxpnoeH1mEQPtfAtKVfJtuaWUZsG5-sTuJqenY-UcOX9tB5AqZIUfaxrnAkoDr36FM_KoARV-qk2TeyGrU1GhgKvWAkH1qKR_Eff6UHwPlq7IVnfk7Amyyg3TMbtV28Y6ruwodagZKXqcrBWU4J_T8ThUr4GaeCw")
-    path = '/data/patents/USPTO-patent_level-metrics-76_20.pqt.gzip'
-    metadata, f = dbx.files_download(path)
-    print(f.content[:4])
-    df = pd.read_parquet(io.BytesIO(f.content))
-    df = df[['gvkey', 'filing_year', 'claim_text', 'patent_abstract', 'patent_title']]
-    return df
+
+def build_fetcher():
+    """
+    Creates the RemoteFetcher for the configured data backend ("dropbox" or "local").
+    """
+    if Config.System.DATA_BACKEND == "local":
+        backend = LocalDirectoryBackend(Config.System.LOCAL_DATA_DIRECTORY)
+    else:
+        backend = DropboxBackend(Config.System.DROPBOX_ACCESS_TOKEN)
+    return RemoteFetcher(
+        backend,
+        DownloadCache(Config.System.DOWNLOAD_CACHE_DIRECTORY),
+        max_workers=Config.System.DOWNLOAD_WORKERS
+    )
+
+def build_vs_partitioner():
+    """
+    Creates the namespace partitioner selected by Config.System.PARTITION_STRATEGY.
+    """
+    strategy = Config.System.PARTITION_STRATEGY
+    kwargs = {}
+    if strategy == "sich":
+        kwargs["digits"] = Config.System.PARTITION_SICH_DIGITS
+    elif strategy == "year":
+        kwargs["span"] = Config.System.PARTITION_YEAR_SPAN
+        kwargs["year_fields"] = Config.System.PARTITION_YEAR_FIELDS
+    return build_partitioner(strategy, Config.System.PINECONE_NAMESPACE, **kwargs)
+
+def build_vs_manager(context_cache_path=None):
+    """
+    Creates the VectorStoreManager from the configured Pinecone settings.
+
+    Args:
+        context_cache_path (str, optional): Context cache file. Defaults to
+            Config.System.CONTEXT_CACHE_PATH.
+    """
+    if context_cache_path is None:
+        context_cache_path = Config.System.CONTEXT_CACHE_PATH
+    return VectorStoreManager(
+        index_name=Config.System.PINECONE_INDEX_NAME,
+        pinecone_api_key=Config.System.PINECONE_API_KEY,
+        namespace=Config.System.PINECONE_NAMESPACE,
+        embeddings_model_name=Config.Project.EMBEDDINGS_MODEL_NAME,
+        cloud=Config.System.PINECONE_CLOUD,
+        region=Config.System.PINECONE_REGION,
+        context_cache=ContextCache(
+            context_cache_path,
+            freshness_seconds=Config.System.CONTEXT_CACHE_FRESHNESS_SECONDS),
+        partitioner=build_vs_partitioner()
+    )
 
 def main():
     # Load environment variables if needed
@@ -37,58 +81,115 @@ def main():
     # report_loader = ReportLoader(Config.System.REPORTS_DIRECTORY, cik_maping)
     # documents = report_loader.load_all_documents(desired_sections=["Item 1", "Item 7"])
 
-    df = load_parquet()
-    df = df.dropna(subset=['claim_text'])
-
-    # Convert each row into a document format expected by the embedding pipeline.
-    # Here, claim_text is the text to embed, while gvkey and issue_year are set as metadata.
-    documents = []
-    for _, row in df.iterrows():
-        doc = Document(
-            page_content=row['claim_text'],
-            metadata={
-                "gvkey": row['gvkey'],
-                "filing_year": row['filing_year'],
-                'patent_abstract': row['patent_abstract'],
-                'patent_title': row['patent_title']
-            }
-        )
-        documents.append(doc)
-
     # Split documents into smaller chunks (optional)
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=Config.Project.CHUNK_SIZE,
         chunk_overlap=Config.Project.CHUNK_OVERLAP,
         length_function=len
     )
-    split_docs = splitter.split_documents(documents)
-    print("After splitting, we have " + str(len(split_docs)) + " chunks.")
-
-    # Create a Pinecone client instance.
-    pc = Pinecone(api_key=Config.System.PINECONE_API_KEY)
 
     # Create or load Chroma vector store
-    vs_manager = VectorStoreManager(
-        index_name=Config.System.PINECONE_INDEX_NAME,
-        pinecone_api_key=Config.System.PINECONE_API_KEY,
-        namespace=Config.System.PINECONE_NAMESPACE,
-        embeddings_model_name=Config.Project.EMBEDDINGS_MODEL_NAME,
-        cloud=Config.System.PINECONE_CLOUD,
-        region=Config.System.PINECONE_REGION
-    )
+    vs_manager = build_vs_manager()
 
     # Check if the index already exists
-    if Config.System.PINECONE_INDEX_NAME in pc.list_indexes().names():
+    if Config.System.PINECONE_INDEX_NAME in pinecone_pool.list_index_names(Config.System.PINECONE_API_KEY):
         print(
             "Loading existing vectorstore from Pinecone index: " + Config.System.PINECONE_INDEX_NAME)
         vs_manager.load_vectorstore()
-        # Now upsert new documents into the current vectorstore.
-        print("Upserting new vectors...")
-        vs_manager.upsert_documents(split_docs)
-    else:
-        print(
-            "Creating new vectorstore in Pinecone index: " + Config.System.PINECONE_INDEX_NAME)
-        vs_manager.create_vectorstore(split_docs)
+
+    # Files already ingested into this index (same content hash) are skipped.
+    ingested = IngestionRecord(Config.System.INGESTED_FILES_PATH)
+
+    def ingestion_key(remote_file):
+        return Config.System.PINECONE_INDEX_NAME + " " + remote_file.content_hash
+
+    # Each patent file is parsed and upserted as soon as its download lands,
+    # while the remaining files keep downloading in the background.
+    fetched = build_fetcher().iter_fetch(
+        Config.System.PATENT_DATA_PATHS,
+        skip=lambda remote_file: ingested.contains(ingestion_key(remote_file)))
+    for remote_file, local_path in fetched:
+        df = PatentLoader.load_dataframe(local_path)
+        documents = PatentLoader.dataframe_to_documents(df)
+        split_docs = splitter.split_documents(documents)
+        print(remote_file.name + ": after splitting, we have " + str(len(split_docs)) + " chunks.")
+        # IDs derived from the file content make a re-run overwrite, not duplicate.
+        ids = [remote_file.content_hash + "#" + str(i) for i in range(len(split_docs))]
+
+        if vs_manager.vectorstore is None:
+            print(
+                "Creating new vectorstore in Pinecone index: " + Config.System.PINECONE_INDEX_NAME)
+            vs_manager.create_vectorstore(split_docs, ids=ids)
+        else:
+            # Now upsert new documents into the current vectorstore.
+            print("Upserting new vectors...")
+            vs_manager.upsert_documents(split_docs, ids=ids)
+        ingested.add(ingestion_key(remote_file))
+
+def coordinate(args):
+    """
+    Splits the input into shards and enqueues them for ingestion workers.
+    """
+    queue = LeaseQueue(args.queue)
+    shards = []
+    if args.parquet:
+        shards.extend(parquet_row_group_shards(args.parquet))
+    if args.reports:
+        shards.extend(report_file_shards(args.reports, args.num_shards))
+    added = queue.add_shards(shards)
+    print("Enqueued " + str(added) + " new shards (" + str(len(shards)) + " total). Status: " + str(queue.counts()))
+
+def ingest(args):
+    """
+    Runs one ingestion worker against the shared queue. The Pinecone index
+    must already exist. Workers run on the query host and invalidate the
+    context cache that queries read.
+    """
+    Config.System.load_from_env()
+
+    cik_mapping = None
+    if args.cik_csv:
+        cik_mapping = CSVLoader(args.cik_csv).load_cik_sich_mapping()
+
+    context_cache_path = os.path.abspath(args.context_cache)
+    print("Upserts invalidate the context cache at " + context_cache_path)
+    vs_manager = build_vs_manager(context_cache_path)
+    vs_manager.load_vectorstore()
+
+    worker = IngestionWorker(
+        LeaseQueue(args.queue),
+        vs_manager,
+        worker_id=args.worker_id,
+        lease_seconds=args.lease_seconds,
+        cik_to_sich=cik_mapping,
+        desired_sections=args.sections
+    )
+    worker.run()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Ingest patents and 10-K reports into Pinecone.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    coordinate_parser = subparsers.add_parser("coordinate", help="Enqueue ingestion shards.")
+    coordinate_parser.add_argument("--queue", default=Config.System.INGESTION_QUEUE_PATH)
+    coordinate_parser.add_argument("--parquet", nargs="*", default=[],
+                                   help="Parquet files; one shard per row group.")
+    coordinate_parser.add_argument("--reports", help="Directory of JSON reports; sharded by CIK.")
+    coordinate_parser.add_argument("--num-shards", type=int, default=64)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Run an ingestion worker.")
+    ingest_parser.add_argument("--queue", default=Config.System.INGESTION_QUEUE_PATH)
+    ingest_parser.add_argument("--worker-id", default=None)
+    ingest_parser.add_argument("--lease-seconds", type=float, default=Config.System.INGESTION_LEASE_SECONDS)
+    ingest_parser.add_argument("--cik-csv", default=None, help="CSV mapping CIK to SICH and company name.")
+    ingest_parser.add_argument("--sections", nargs="*", default=None, help="e.g. \"Item 1\" \"Item 7\"")
+    ingest_parser.add_argument("--context-cache", default=Config.System.CONTEXT_CACHE_PATH,
+                               help="Context cache read by the query process on this host.")
+
+    args = parser.parse_args()
+    if args.command == "coordinate":
+        coordinate(args)
+    elif args.command == "ingest":
+        ingest(args)
+    else:
+        main()
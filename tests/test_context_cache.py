@@ -0,0 +1,83 @@
+"""
+Tests for the retrieved-context cache and its invalidation rules.
+"""
+
+import time
+
+from langchain.schema import Document
+
+from vectorstore.context_cache import ContextCache
+
+PARAMS = {"query": "business description", "k": 10, "partitioning": {"strategy": "none"}}
+
+
+def _put(cache, cik, sich, fyear=2020, params=PARAMS, generation=None):
+    return cache.put(
+        cik, sich, fyear, params,
+        [cik + "#0"], "context of " + cik,
+        ["peer#0"], "peers of " + cik,
+        generation=generation
+    )
+
+
+def test_get_returns_stored_context(tmp_path):
+    cache = ContextCache(str(tmp_path / "cache.sqlite"), freshness_seconds=0)
+    assert cache.get("1", "3711", 2020, PARAMS) is None
+
+    assert _put(cache, "1", "3711")
+    assert cache.get("1", "3711", 2020, PARAMS) == {
+        "chunk_ids": ["1#0"],
+        "context": "context of 1",
+        "sich_chunk_ids": ["peer#0"],
+        "context_same_SICH": "peers of 1",
+    }
+    assert cache.get("1", "3711", 2021, PARAMS) is None
+    assert cache.get("1", "3711", 2020, dict(PARAMS, k=5)) is None
+
+
+def test_params_key_is_stable():
+    reordered = {"partitioning": {"strategy": "none"}, "k": 10, "query": "business description"}
+    assert ContextCache.params_key(PARAMS) == ContextCache.params_key(reordered)
+    assert ContextCache.params_key(None) == ContextCache.params_key({})
+    assert ContextCache.params_key(PARAMS) != ContextCache.params_key(dict(PARAMS, k=5))
+
+
+def test_put_is_rejected_after_invalidation_bumps_generation(tmp_path):
+    cache = ContextCache(str(tmp_path / "cache.sqlite"), freshness_seconds=0)
+    generation = cache.generation("1", "3711")
+
+    # An upsert for the firm lands while its context is being retrieved.
+    cache.invalidate(ciks=["1"])
+    assert cache.generation("1", "3711") != generation
+    assert not _put(cache, "1", "3711", generation=generation)
+    assert cache.get("1", "3711", 2020, PARAMS) is None
+
+    assert _put(cache, "1", "3711", generation=cache.generation("1", "3711"))
+
+
+def test_sich_invalidation_drops_peer_entries(tmp_path):
+    cache = ContextCache(str(tmp_path / "cache.sqlite"), freshness_seconds=0)
+    _put(cache, "1", "3711")
+    _put(cache, "2", "3711")
+    _put(cache, "3", "2834")
+
+    removed = cache.invalidate_for_documents([
+        Document(page_content="new 10-K", metadata={"cik": "2", "sich": "3711"})])
+
+    assert removed == 2
+    assert cache.get("1", "3711", 2020, PARAMS) is None
+    assert cache.get("2", "3711", 2020, PARAMS) is None
+    assert cache.get("3", "2834", 2020, PARAMS) is not None
+
+
+def test_put_is_refused_within_freshness_window(tmp_path):
+    cache = ContextCache(str(tmp_path / "cache.sqlite"), freshness_seconds=0.5)
+    cache.invalidate(sichs=["3711"])
+    generation = cache.generation("1", "3711")
+
+    # The index may still return the old documents right after the upsert.
+    assert not _put(cache, "1", "3711", generation=generation)
+    assert _put(cache, "3", "2834")
+
+    time.sleep(0.6)
+    assert _put(cache, "1", "3711", generation=generation)
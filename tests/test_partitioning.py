@@ -0,0 +1,120 @@
+"""
+Tests for namespace partitioners and partition fan-out in VectorStoreManager.
+"""
+
+import pytest
+from langchain.schema import Document
+
+from vectorstore.partitioning import (
+    NamespacePartitioner, SichPartitioner, YearRangePartitioner, build_partitioner)
+from vectorstore.vectorstore_manager import VectorStoreManager
+
+
+def test_sich_partitioner_namespaces():
+    partitioner = SichPartitioner("reports", digits=2)
+    assert partitioner.namespace_for({"sich": "3711"}) == "reports-sich-37"
+    assert partitioner.namespace_for({"sich": "211"}) == "reports-sich-02"
+    assert partitioner.namespace_for({}) == "reports-sich-unknown"
+
+    available = lambda: ["reports-sich-37", "reports-sich-02", "patents", "reports-years-2000-2004"]
+    assert partitioner.namespaces_for_query(available, sich="3714") == ["reports-sich-37"]
+    assert partitioner.namespaces_for_query(available) == ["reports-sich-37", "reports-sich-02"]
+
+
+def test_year_partitioner_reads_report_and_patent_years():
+    partitioner = YearRangePartitioner("docs", span=5)
+    # Reports carry the fiscal year in "date", patents in "filing_year".
+    assert partitioner.namespace_for({"date": 2003, "cik": "1"}) == "docs-years-2000-2004"
+    assert partitioner.namespace_for({"filing_year": "2011"}) == "docs-years-2010-2014"
+    assert partitioner.namespace_for({"date": None, "filing_year": 1999}) == "docs-years-1995-1999"
+    assert partitioner.namespace_for({"date": "n/a"}) == "docs-years-unknown"
+
+
+def test_year_partitioner_query_ranges():
+    partitioner = YearRangePartitioner("docs", span=5)
+    available = lambda: [
+        "docs-years-1995-1999", "docs-years-2000-2004", "docs-years-2005-2009",
+        "docs-years-unknown", "docs-sich-3711",
+    ]
+    assert partitioner.namespaces_for_query(available) == available()[:4]
+    # A closed range can rule out documents without a year...
+    assert partitioner.namespaces_for_query(available, year_range=(2001, 2006)) == [
+        "docs-years-2000-2004", "docs-years-2005-2009"]
+    # ...an open range cannot.
+    assert partitioner.namespaces_for_query(available, year_range=(None, 2002)) == [
+        "docs-years-1995-1999", "docs-years-2000-2004", "docs-years-unknown"]
+    assert partitioner.namespaces_for_query(available, year_range=(2005, None)) == [
+        "docs-years-2005-2009", "docs-years-unknown"]
+
+
+def test_build_partitioner():
+    assert isinstance(build_partitioner("none", "patents"), NamespacePartitioner)
+    assert build_partitioner("sich", "reports", digits=2).digits == 2
+    assert build_partitioner("year", "reports", span=10).describe()["span"] == 10
+    with pytest.raises(ValueError):
+        build_partitioner("cik", "reports")
+
+
+class FakeNamespaceStore(object):
+    """
+    Stands in for PineconeVectorStore: returns fixed (Document, score) hits.
+    """
+
+    def __init__(self, hits):
+        self.hits = hits
+        self.queries = []
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None):
+        self.queries.append((embedding, k, filter))
+        return sorted(self.hits, key=lambda hit: -hit[1])[:k]
+
+
+class FakeEmbeddings(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [0.1, 0.2]
+
+
+def _manager(partitioner, stores):
+    # Bypasses __init__, which connects to Pinecone.
+    manager = VectorStoreManager.__new__(VectorStoreManager)
+    manager.partitioner = partitioner
+    manager.vectorstore = object()
+    manager.embedding_function = FakeEmbeddings()
+    manager._namespace_stores = stores
+    manager.list_namespaces = lambda refresh=False: list(stores.keys())
+    return manager
+
+
+def _hits(namespace, scores):
+    return [(Document(page_content=namespace + str(i), metadata={}), s) for i, s in enumerate(scores)]
+
+
+def test_query_partitions_merges_top_k_across_namespaces():
+    stores = {
+        "r-years-2000-2004": FakeNamespaceStore(_hits("a", [0.91, 0.52, 0.30])),
+        "r-years-2005-2009": FakeNamespaceStore(_hits("b", [0.88, 0.87, 0.10])),
+        "r-years-2010-2014": FakeNamespaceStore(_hits("c", [0.99, 0.95])),
+        "r-years-unknown": FakeNamespaceStore(_hits("u", [0.60])),
+    }
+    manager = _manager(YearRangePartitioner("r", span=5), stores)
+
+    results = manager.query_partitions("q", k=4, year_range=(None, 2009), filter={"cik": {"$eq": "1"}})
+
+    assert [doc.page_content for doc, _ in results] == ["a0", "b0", "b1", "u0"]
+    assert [score for _, score in results] == [0.91, 0.88, 0.87, 0.60]
+    # The query is embedded once and sent to every selected partition only.
+    assert manager.embedding_function.calls == 1
+    assert stores["r-years-2010-2014"].queries == []
+    for namespace in ("r-years-2000-2004", "r-years-2005-2009", "r-years-unknown"):
+        assert stores[namespace].queries == [([0.1, 0.2], 4, {"cik": {"$eq": "1"}})]
+
+
+def test_query_partitions_without_matching_partitions_returns_nothing():
+    manager = _manager(YearRangePartitioner("r", span=5), {"r-years-2000-2004": FakeNamespaceStore([])})
+    assert manager.query_partitions("q", k=3, year_range=(2020, 2024)) == []
+    assert manager.embedding_function.calls == 0
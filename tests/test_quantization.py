@@ -0,0 +1,85 @@
+"""
+Tests for the quantized local vector store.
+"""
+
+import numpy as np
+import pytest
+
+from vectorstore.quantization import QuantizedVectorStore, ScalarQuantizer, ProductQuantizer
+
+DIMENSION = 64
+
+
+def _clustered_vectors(n, seed=0):
+    # Embeddings are clustered by topic, so near neighbours are close but not identical.
+    rng = np.random.RandomState(seed)
+    centers = rng.normal(size=(20, DIMENSION))
+    return (centers[rng.randint(0, 20, n)] + 0.5 * rng.normal(size=(n, DIMENSION))).astype(np.float32)
+
+
+def _build_store(directory, quantizer, vectors):
+    store = QuantizedVectorStore(directory, DIMENSION, quantizer=quantizer)
+    store.train(vectors)
+    for start in range(0, len(vectors), 500):
+        batch = vectors[start:start + 500]
+        store.add(batch, ["v" + str(start + i) for i in range(len(batch))])
+    return store
+
+
+@pytest.mark.parametrize("quantizer, ratio", [
+    (ScalarQuantizer(), 4.0),
+    (ProductQuantizer(num_subvectors=DIMENSION // 8, num_iterations=10), 32.0),
+])
+def test_rescoring_improves_recall(tmp_path, quantizer, ratio):
+    vectors = _clustered_vectors(2000)
+    store = _build_store(str(tmp_path), quantizer, vectors)
+    queries = _clustered_vectors(30, seed=1)
+
+    report = store.evaluate_recall(queries, k=10, num_candidates=200)
+
+    assert report["compression_ratio"] == ratio
+    assert report["code_bytes"] * ratio == report["full_bytes"]
+    assert report["recall_at_k"] >= 0.95
+    assert report["recall_at_k"] > report["recall_at_k_without_rescoring"]
+
+
+def test_rescored_scores_are_exact_cosine_similarities(tmp_path):
+    vectors = _clustered_vectors(500)
+    store = _build_store(str(tmp_path), ScalarQuantizer(), vectors)
+
+    results = store.search(vectors[7], k=5)
+    assert results[0][0] == "v7"
+    assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert [i for i, _ in results] == [i for i, _ in store.exact_search(vectors[7], k=5)]
+
+
+def test_save_load_round_trip_then_add(tmp_path):
+    vectors = _clustered_vectors(1000)
+    store = _build_store(str(tmp_path), ProductQuantizer(num_subvectors=8, num_iterations=5), vectors[:600])
+    store.save()
+    before = store.search(vectors[3], k=5)
+
+    loaded = QuantizedVectorStore.load(str(tmp_path))
+    assert loaded.quantizer.kind == "product"
+    assert loaded.search(vectors[3], k=5) == before
+
+    # New vectors are appended to the existing vector file, not written over it.
+    loaded.add(vectors[600:], ["v" + str(i) for i in range(600, 1000)])
+    assert len(loaded) == 1000
+    assert loaded.search(vectors[3], k=1)[0][0] == "v3"
+    assert loaded.search(vectors[900], k=1)[0][0] == "v900"
+
+
+def test_empty_store_returns_no_results(tmp_path):
+    store = QuantizedVectorStore(str(tmp_path), DIMENSION)
+    store.train(_clustered_vectors(100))
+    query = _clustered_vectors(1)[0]
+
+    assert store.search(query, k=5) == []
+    assert store.exact_search(query, k=5) == []
+
+
+def test_add_requires_training(tmp_path):
+    store = QuantizedVectorStore(str(tmp_path), DIMENSION)
+    with pytest.raises(ValueError):
+        store.add(_clustered_vectors(2), ["a", "b"])
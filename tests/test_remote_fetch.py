@@ -0,0 +1,139 @@
+"""
+Tests for concurrent remote fetching, with LocalDirectoryBackend standing in
+for Dropbox.
+"""
+
+import os
+import hashlib
+import threading
+
+import pytest
+
+from data_ingestion.remote_fetch import (
+    RemoteFetcher, LocalDirectoryBackend, DownloadCache, IngestionRecord, ContentHasher,
+    file_content_hash, HASH_BLOCK_SIZE)
+
+
+class CountingBackend(LocalDirectoryBackend):
+    """
+    Local backend that records which files were downloaded.
+    """
+
+    def __init__(self, root):
+        LocalDirectoryBackend.__init__(self, root)
+        self.downloaded = []
+        self.started = threading.Event()
+
+    def download(self, remote_file, out):
+        self.started.set()
+        self.downloaded.append(remote_file.path)
+        LocalDirectoryBackend.download(self, remote_file, out)
+
+
+def _make_remote(root, names):
+    folder = os.path.join(root, "data", "patents")
+    os.makedirs(folder)
+    for i, name in enumerate(names):
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(os.urandom(1000 + i))
+
+
+def test_content_hash_matches_dropbox_algorithm(tmp_path):
+    data = os.urandom(HASH_BLOCK_SIZE + 123)
+    blocks = [data[:HASH_BLOCK_SIZE], data[HASH_BLOCK_SIZE:]]
+    expected = hashlib.sha256(b"".join(hashlib.sha256(b).digest() for b in blocks)).hexdigest()
+
+    hasher = ContentHasher()
+    hasher.update(data[:10])
+    hasher.update(data[10:])
+    assert hasher.hexdigest() == expected
+
+    path = str(tmp_path / "file.bin")
+    with open(path, "wb") as f:
+        f.write(data)
+    assert file_content_hash(path) == expected
+
+
+def test_fetch_downloads_once_and_then_hits_cache(tmp_path):
+    root = str(tmp_path / "remote")
+    _make_remote(root, ["m-1.pqt.gzip", "m-2.pqt.gzip", "m-3.pqt.gzip", "other.csv"])
+    backend = CountingBackend(root)
+    fetcher = RemoteFetcher(backend, DownloadCache(str(tmp_path / "cache")), max_workers=2)
+
+    landed = []
+    paths = fetcher.fetch(
+        ["/data/patents/m-*.pqt.gzip", "/data/patents/m-1.pqt.gzip"],
+        on_file=lambda remote_file, local_path: landed.append(remote_file.name))
+
+    assert sorted(landed) == ["m-1.pqt.gzip", "m-2.pqt.gzip", "m-3.pqt.gzip"]
+    assert len(backend.downloaded) == 3
+    for path in paths:
+        assert file_content_hash(path) == os.path.basename(path).split("-")[0]
+
+    backend.downloaded = []
+    assert sorted(fetcher.fetch("/data/patents/m-*.pqt.gzip")) == sorted(paths)
+    assert backend.downloaded == []
+
+
+def test_downloads_start_before_cached_files_are_yielded(tmp_path):
+    root = str(tmp_path / "remote")
+    _make_remote(root, ["a.pqt", "b.pqt"])
+    cache = DownloadCache(str(tmp_path / "cache"))
+    RemoteFetcher(LocalDirectoryBackend(root), cache).fetch("/data/patents/a.pqt")
+
+    backend = CountingBackend(root)
+    iterator = RemoteFetcher(backend, cache).iter_fetch("/data/patents/*.pqt")
+    remote_file, _ = next(iterator)
+    assert remote_file.name == "a.pqt"
+    # b.pqt is downloading while the caller handles the cached a.pqt.
+    assert backend.started.wait(5)
+    assert [r.name for r, _ in iterator] == ["b.pqt"]
+
+
+def test_hash_mismatch_raises_and_leaves_no_partial_file(tmp_path):
+    root = str(tmp_path / "remote")
+    _make_remote(root, ["good.pqt", "bad.pqt"])
+    cache_dir = str(tmp_path / "cache")
+
+    class CorruptingBackend(LocalDirectoryBackend):
+        # Serves bytes that do not match the listed content hash for bad.pqt.
+        def download(self, remote_file, out):
+            if remote_file.name == "bad.pqt":
+                out.write(b"corrupted")
+            else:
+                LocalDirectoryBackend.download(self, remote_file, out)
+
+    fetcher = RemoteFetcher(CorruptingBackend(root), DownloadCache(cache_dir))
+    landed = []
+    with pytest.raises(RuntimeError) as excinfo:
+        fetcher.fetch("/data/patents/*.pqt", on_file=lambda r, p: landed.append(r.name))
+
+    assert "bad.pqt" in str(excinfo.value)
+    assert landed == ["good.pqt"]
+    names = os.listdir(cache_dir)
+    assert len(names) == 1 and names[0].endswith("-good.pqt")
+
+
+def test_ingested_files_are_skipped_until_their_content_changes(tmp_path):
+    root = str(tmp_path / "remote")
+    _make_remote(root, ["a.pqt", "b.pqt"])
+    backend = CountingBackend(root)
+    fetcher = RemoteFetcher(backend, DownloadCache(str(tmp_path / "cache")))
+    record_path = str(tmp_path / "ingested.txt")
+
+    record = IngestionRecord(record_path)
+    fetcher.fetch("/data/patents/*.pqt", on_file=lambda r, p: record.add(r.content_hash))
+
+    # A fresh record (new process) sees the previous run, so nothing is fetched.
+    record = IngestionRecord(record_path)
+    backend.downloaded = []
+    landed = []
+    fetcher.fetch("/data/patents/*.pqt", on_file=lambda r, p: landed.append(r.name),
+                  skip=lambda r: record.contains(r.content_hash))
+    assert landed == [] and backend.downloaded == []
+
+    with open(os.path.join(root, "data", "patents", "b.pqt"), "ab") as f:
+        f.write(b"new rows")
+    fetcher.fetch("/data/patents/*.pqt", on_file=lambda r, p: landed.append(r.name),
+                  skip=lambda r: record.contains(r.content_hash))
+    assert landed == ["b.pqt"] and backend.downloaded == ["/data/patents/b.pqt"]
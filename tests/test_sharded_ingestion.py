@@ -0,0 +1,170 @@
+"""
+Tests for the lease queue and sharded multi-worker ingestion, using several
+local processes and a fake vector store.
+"""
+
+import os
+import json
+import time
+import multiprocessing
+
+import pandas as pd
+import pytest
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_ingestion import work_queue
+from data_ingestion.work_queue import LeaseQueue
+from data_ingestion.sharded_ingestion import (
+    IngestionWorker, parquet_row_group_shards, report_file_shards)
+
+
+class FakeVectorStore(object):
+    """
+    Records upserted chunk IDs in a per-process file instead of calling Pinecone.
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, "upserts-" + str(os.getpid()) + ".txt")
+
+    def upsert_documents(self, documents, ids=None):
+        assert len(ids) == len(documents)
+        with open(self.path, "a") as f:
+            for vector_id in ids:
+                f.write(vector_id + "\n")
+
+
+def _write_patents(path, num_rows, row_group_size):
+    df = pd.DataFrame({
+        "gvkey": [str(i % 7) for i in range(num_rows)],
+        "filing_year": [2000 + i % 10 for i in range(num_rows)],
+        "claim_text": ["claim number " + str(i) for i in range(num_rows)],
+        "patent_abstract": ["abstract"] * num_rows,
+        "patent_title": ["title"] * num_rows,
+    })
+    pq.write_table(pa.Table.from_pandas(df), path, row_group_size=row_group_size)
+
+
+def _write_report(directory, cik, accession):
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    filename = "20210101_10K_edgar_data_" + cik + "_" + accession + ".json"
+    with open(os.path.join(directory, filename), "w", encoding="utf-8") as f:
+        json.dump({"Item 1": "Business of " + accession, "Item 7": "MD&A of " + accession}, f)
+
+
+def _run_worker(queue_path, output_dir, worker_id):
+    worker = IngestionWorker(
+        LeaseQueue(queue_path),
+        FakeVectorStore(output_dir),
+        worker_id=worker_id,
+        lease_seconds=2,
+        poll_seconds=0.2
+    )
+    worker.run()
+
+
+def _read_upserts(directory):
+    ids = []
+    for name in os.listdir(directory):
+        if name.startswith("upserts-"):
+            with open(os.path.join(directory, name)) as f:
+                ids.extend(f.read().split())
+    return ids
+
+
+def test_workers_process_every_shard_once(tmp_path):
+    parquet_path = str(tmp_path / "patents.pqt")
+    _write_patents(parquet_path, num_rows=1000, row_group_size=50)
+    queue_path = str(tmp_path / "queue.sqlite")
+    output_dir = str(tmp_path / "out")
+    os.makedirs(output_dir)
+
+    queue = LeaseQueue(queue_path)
+    assert queue.add_shards(parquet_row_group_shards([parquet_path])) == 20
+    assert queue.add_shards(parquet_row_group_shards([parquet_path])) == 0
+
+    # A crashed worker holds one lease; it must be reassigned once it expires.
+    abandoned = queue.acquire("crashed-worker", 1)
+
+    processes = [
+        multiprocessing.Process(target=_run_worker, args=(queue_path, output_dir, "worker-" + str(i)))
+        for i in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    ids = _read_upserts(output_dir)
+    assert len(ids) == 1000
+    assert len(set(ids)) == 1000
+    assert any(i.startswith(abandoned["shard_id"] + "#") for i in ids)
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 20, "failed": 0}
+
+
+def test_expired_lease_is_reassigned(tmp_path):
+    queue = LeaseQueue(str(tmp_path / "queue.sqlite"))
+    queue.add_shards([{"shard_id": "a", "kind": "parquet"}])
+
+    assert queue.acquire("w1", 0.2)["shard_id"] == "a"
+    assert queue.acquire("w2", 10) is None
+    time.sleep(0.3)
+
+    assert queue.acquire("w2", 10)["shard_id"] == "a"
+    # The original holder can neither renew nor complete the lease any more.
+    assert not queue.heartbeat("a", "w1", 10)
+    assert not queue.complete("a", "w1")
+    assert queue.heartbeat("a", "w2", 10)
+    assert queue.complete("a", "w2")
+    assert queue.is_finished()
+
+
+def test_failing_shard_is_marked_failed_after_max_attempts(tmp_path):
+    queue = LeaseQueue(str(tmp_path / "queue.sqlite"), max_attempts=2)
+    queue.add_shards([{"shard_id": "a", "kind": "parquet"}])
+
+    for _ in range(2):
+        assert queue.acquire("w1", 10)["shard_id"] == "a"
+        queue.fail("a", "w1", "boom")
+
+    assert queue.acquire("w1", 10) is None
+    assert queue.counts()["failed"] == 1
+    assert queue.is_finished()
+
+
+def test_queue_refuses_network_filesystems(tmp_path, monkeypatch):
+    monkeypatch.setattr(work_queue, "filesystem_type", lambda path: "nfs4")
+    with pytest.raises(ValueError):
+        LeaseQueue(str(tmp_path / "queue.sqlite"))
+
+
+def test_shard_ids_depend_on_content(tmp_path):
+    _write_report(str(tmp_path / "tree1"), "1234", "0000000001")
+    _write_report(str(tmp_path / "tree2"), "1234", "0000000002")
+    shards1 = report_file_shards(str(tmp_path / "tree1"), 64)
+    shards2 = report_file_shards(str(tmp_path / "tree2"), 64)
+    assert shards1[0]["shard_id"] != shards2[0]["shard_id"]
+
+    # New filings for the same CIK produce a new shard.
+    _write_report(str(tmp_path / "tree1"), "1234", "0000000003")
+    assert report_file_shards(str(tmp_path / "tree1"), 64)[0]["shard_id"] != shards1[0]["shard_id"]
+
+    os.makedirs(str(tmp_path / "a"))
+    os.makedirs(str(tmp_path / "b"))
+    _write_patents(str(tmp_path / "a" / "patents.pqt"), num_rows=10, row_group_size=10)
+    _write_patents(str(tmp_path / "b" / "patents.pqt"), num_rows=20, row_group_size=10)
+    ids_a = set(s["shard_id"] for s in parquet_row_group_shards([str(tmp_path / "a" / "patents.pqt")]))
+    ids_b = set(s["shard_id"] for s in parquet_row_group_shards([str(tmp_path / "b" / "patents.pqt")]))
+    assert not ids_a & ids_b
+
+
+def test_report_chunk_ids_are_keyed_by_filing(tmp_path):
+    _write_report(str(tmp_path / "tree"), "1234", "0000000001")
+    shard = report_file_shards(str(tmp_path / "tree"), 8)[0]
+    worker = IngestionWorker(LeaseQueue(str(tmp_path / "queue.sqlite")), None, worker_id="w")
+
+    split_docs = worker.splitter.split_documents(worker.load_shard_documents(shard))
+    ids = IngestionWorker.chunk_ids(shard, split_docs)
+    assert sorted(ids) == ["0000000001#Item 1#0", "0000000001#Item 7#0"]
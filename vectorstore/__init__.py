@@ -2,9 +2,25 @@
 vectorstore package.
 
 Provides the VectorStoreManager class for creating and managing
-Chroma-based vector stores.
+Chroma-based vector stores, and QuantizedVectorStore for compressed
+local copies of the stored embeddings. ContextCache persists retrieved
+prompt contexts per firm-year. Namespace partitioners spread vectors over
+Pinecone namespaces so scoped queries only touch matching partitions.
 """
 
-__all__ = ["VectorStoreManager"]
+__all__ = [
+    "VectorStoreManager",
+    "QuantizedVectorStore",
+    "ScalarQuantizer",
+    "ProductQuantizer",
+    "ContextCache",
+    "NamespacePartitioner",
+    "SichPartitioner",
+    "YearRangePartitioner",
+    "build_partitioner",
+]
 
 from .vectorstore_manager import VectorStoreManager
+from .quantization import QuantizedVectorStore, ScalarQuantizer, ProductQuantizer
+from .context_cache import ContextCache
+from .partitioning import NamespacePartitioner, SichPartitioner, YearRangePartitioner, build_partitioner
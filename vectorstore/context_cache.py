@@ -0,0 +1,265 @@
+"""
+context_cache.py
+
+Persistent cache of retrieved prompt context for firm-year prompts.
+
+PROMPT_TEMPLATE is filled repeatedly for the same CIK/fiscal year (QUESTION_1,
+QUESTION_2 and later chat turns), and each fill would otherwise repeat the same
+two retrievals for {context} and {context_same_SICH}. Entries are keyed by
+(cik, sich, fyear, retrieval params) and stored in SQLite so that panel reruns
+and new sessions can reuse them. Entries are dropped whenever documents for
+their CIK or SICH are upserted.
+
+Each CIK and SICH also has a generation counter that is bumped on every
+invalidation. A caller reads the generation before retrieving and passes it to
+put(), which skips the write if an upsert invalidated the CIK or SICH in the
+meantime. Pinecone serverless is eventually consistent, so a retrieval that
+starts shortly after an upsert may still see the old documents; put() therefore
+also refuses to store anything for a CIK or SICH within `freshness_seconds` of
+its last invalidation.
+"""
+
+import os
+import json
+import time
+import sqlite3
+
+
+class ContextCache(object):
+    """
+    SQLite-backed cache mapping (cik, sich, fyear, params) to the ranked chunk
+    IDs and assembled context text for both the company and its industry peers.
+    """
+
+    def __init__(self, db_path, freshness_seconds=300):
+        """
+        Args:
+            db_path (str): Path to the SQLite database file. Created if missing.
+            freshness_seconds (float): Time after an invalidation during which
+                the index may still return the old documents, so contexts for
+                the invalidated CIK or SICH are not stored.
+        """
+        self.db_path = db_path
+        self.freshness_seconds = freshness_seconds
+        directory = os.path.dirname(db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS contexts ("
+            " cik TEXT NOT NULL,"
+            " sich TEXT NOT NULL,"
+            " fyear INTEGER NOT NULL,"
+            " params TEXT NOT NULL,"
+            " chunk_ids TEXT NOT NULL,"
+            " context TEXT NOT NULL,"
+            " sich_chunk_ids TEXT NOT NULL,"
+            " context_same_sich TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (cik, sich, fyear, params))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS contexts_sich ON contexts (sich)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            " scope TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " generation INTEGER NOT NULL,"
+            " invalidated_at REAL NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (scope, key))"
+        )
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(generations)")]
+        if "invalidated_at" not in columns:
+            conn.execute("ALTER TABLE generations ADD COLUMN invalidated_at REAL NOT NULL DEFAULT 0")
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @staticmethod
+    def params_key(params):
+        """
+        Serializes retrieval parameters (query, k, filters, ...) into a stable
+        string so that equal parameter dicts map to the same cache entry.
+        """
+        if params is None:
+            params = {}
+        return json.dumps(params, sort_keys=True, default=str)
+
+    @staticmethod
+    def _read_generation(conn, cik, sich):
+        generation = []
+        for scope, key in (("cik", str(cik)), ("sich", str(sich or ""))):
+            row = conn.execute(
+                "SELECT generation FROM generations WHERE scope = ? AND key = ?", (scope, key)
+            ).fetchone()
+            generation.append(row[0] if row else 0)
+        return tuple(generation)
+
+    @staticmethod
+    def _last_invalidation(conn, cik, sich):
+        row = conn.execute(
+            "SELECT MAX(invalidated_at) FROM generations"
+            " WHERE (scope = 'cik' AND key = ?) OR (scope = 'sich' AND key = ?)",
+            (str(cik), str(sich or ""))
+        ).fetchone()
+        return row[0] or 0
+
+    def generation(self, cik, sich):
+        """
+        Returns the current invalidation generation of a CIK/SICH pair. Read it
+        before retrieving and pass it to put() as `generation`.
+
+        Returns:
+            tuple: (cik generation, sich generation).
+        """
+        conn = self._connect()
+        generation = self._read_generation(conn, cik, sich)
+        conn.close()
+        return generation
+
+    def get(self, cik, sich, fyear, params=None):
+        """
+        Looks up a cached context.
+
+        Args:
+            cik (str): Company CIK.
+            sich (str): Company SICH code ("" if unknown).
+            fyear (int): Fiscal year the prompt is written for.
+            params (dict): Retrieval parameters used to build the context.
+
+        Returns:
+            dict or None: Keys "chunk_ids", "context", "sich_chunk_ids" and
+                "context_same_SICH", or None on a cache miss.
+        """
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT chunk_ids, context, sich_chunk_ids, context_same_sich FROM contexts"
+            " WHERE cik = ? AND sich = ? AND fyear = ? AND params = ?",
+            (str(cik), str(sich or ""), int(fyear), self.params_key(params))
+        ).fetchone()
+        conn.close()
+
+        if row is None:
+            return None
+        return {
+            "chunk_ids": json.loads(row[0]),
+            "context": row[1],
+            "sich_chunk_ids": json.loads(row[2]),
+            "context_same_SICH": row[3],
+        }
+
+    def put(self, cik, sich, fyear, params, chunk_ids, context, sich_chunk_ids, context_same_sich,
+            generation=None):
+        """
+        Stores (or replaces) a cached context.
+
+        Args:
+            cik (str): Company CIK.
+            sich (str): Company SICH code ("" if unknown).
+            fyear (int): Fiscal year the prompt is written for.
+            params (dict): Retrieval parameters used to build the context.
+            chunk_ids (list): Ranked chunk IDs behind {context}.
+            context (str): Assembled text for {context}.
+            sich_chunk_ids (list): Ranked chunk IDs behind {context_same_SICH}.
+            context_same_sich (str): Assembled text for {context_same_SICH}.
+            generation (tuple, optional): Value of generation() read before the
+                retrieval. If the CIK or SICH has been invalidated since, the
+                context is stale and is not stored.
+
+        Returns:
+            bool: True if the entry was stored. False if it was stale or the
+                CIK or SICH was invalidated less than `freshness_seconds` ago.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        stale = generation is not None and tuple(generation) != self._read_generation(conn, cik, sich)
+        settling = time.time() - self._last_invalidation(conn, cik, sich) < self.freshness_seconds
+        if stale or settling:
+            conn.rollback()
+            conn.close()
+            return False
+
+        conn.execute(
+            "INSERT OR REPLACE INTO contexts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                str(cik), str(sich or ""), int(fyear), self.params_key(params),
+                json.dumps(chunk_ids), context,
+                json.dumps(sich_chunk_ids), context_same_sich,
+                time.time()
+            )
+        )
+        conn.commit()
+        conn.close()
+        return True
+
+    def invalidate(self, ciks=None, sichs=None):
+        """
+        Drops every entry whose CIK or SICH is in the given collections.
+
+        Args:
+            ciks (iterable): CIKs whose documents changed.
+            sichs (iterable): SICH codes whose documents changed.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        ciks = sorted(set(str(c) for c in (ciks or []) if c))
+        sichs = sorted(set(str(s) for s in (sichs or []) if s))
+        if not ciks and not sichs:
+            return 0
+
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        for scope, keys in (("cik", ciks), ("sich", sichs)):
+            for key in keys:
+                conn.execute(
+                    "INSERT INTO generations VALUES (?, ?, 1, ?)"
+                    " ON CONFLICT (scope, key) DO UPDATE SET"
+                    " generation = generation + 1, invalidated_at = excluded.invalidated_at",
+                    (scope, key, now)
+                )
+
+        removed = 0
+        if ciks:
+            cursor = conn.execute(
+                "DELETE FROM contexts WHERE cik IN (" + ",".join("?" * len(ciks)) + ")", ciks)
+            removed += cursor.rowcount
+        if sichs:
+            cursor = conn.execute(
+                "DELETE FROM contexts WHERE sich IN (" + ",".join("?" * len(sichs)) + ")", sichs)
+            removed += cursor.rowcount
+        conn.commit()
+        conn.close()
+        return removed
+
+    def invalidate_for_documents(self, documents):
+        """
+        Drops entries affected by newly ingested documents, based on the "cik"
+        and "sich" metadata set by ReportLoader.
+
+        Args:
+            documents (list): List of LangChain Document objects.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        ciks = set()
+        sichs = set()
+        for doc in documents:
+            if doc.metadata.get("cik"):
+                ciks.add(doc.metadata["cik"])
+            if doc.metadata.get("sich"):
+                sichs.add(doc.metadata["sich"])
+        return self.invalidate(ciks, sichs)
+
+    def clear(self):
+        """
+        Removes every cached entry.
+        """
+        conn = self._connect()
+        conn.execute("DELETE FROM contexts")
+        conn.commit()
+        conn.close()
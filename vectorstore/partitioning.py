@@ -0,0 +1,199 @@
+"""
+partitioning.py
+
+Strategies for spreading vectors across Pinecone namespaces.
+
+A partitioner decides which namespace a document is written to (from its
+metadata) and which namespaces a query has to touch. Scoping a query to one
+industry or a range of years then only searches the matching partitions
+instead of the whole index.
+"""
+
+
+class NamespacePartitioner(object):
+    """
+    Default strategy: every document lives in a single namespace.
+    """
+
+    strategy = "none"
+
+    def __init__(self, namespace=""):
+        """
+        Args:
+            namespace (str): The namespace used for all documents.
+        """
+        self.namespace = namespace
+
+    def describe(self):
+        """
+        Returns:
+            dict: Parameters identifying this partitioning (used in cache keys).
+        """
+        return {"strategy": self.strategy, "namespace": self.namespace}
+
+    def namespace_for(self, metadata):
+        """
+        Args:
+            metadata (dict): Document metadata.
+
+        Returns:
+            str: Namespace the document is written to.
+        """
+        return self.namespace
+
+    def owns(self, namespace):
+        """
+        Returns:
+            bool: True if the namespace was produced by this partitioner.
+        """
+        return namespace == self.namespace
+
+    def namespaces_for_query(self, available, sich=None, year_range=None):
+        """
+        Selects the namespaces a query must search.
+
+        Args:
+            available (callable): Returns the namespaces currently present in
+                the index. Only called when the query cannot be narrowed without it.
+            sich (str, optional): Restrict to one industry.
+            year_range (tuple, optional): (first_year, last_year), either may be None.
+
+        Returns:
+            list: Namespaces to query.
+        """
+        return [self.namespace]
+
+
+class SichPartitioner(NamespacePartitioner):
+    """
+    One namespace per SICH code (optionally truncated to a coarser SIC group),
+    e.g. "reports-sich-3711". Documents without SICH go to "<prefix>-sich-unknown".
+    """
+
+    strategy = "sich"
+
+    def __init__(self, namespace="", digits=4):
+        """
+        Args:
+            namespace (str): Prefix for the generated namespaces.
+            digits (int): Number of leading SICH digits that define a partition
+                (4 = full code, 2 = major group).
+        """
+        NamespacePartitioner.__init__(self, namespace)
+        self.digits = digits
+
+    def describe(self):
+        return {"strategy": self.strategy, "namespace": self.namespace, "digits": self.digits}
+
+    def _prefix(self):
+        return self.namespace + "-sich-"
+
+    def namespace_for_sich(self, sich):
+        sich = str(sich or "").strip()
+        if not sich:
+            return self._prefix() + "unknown"
+        return self._prefix() + sich.zfill(4)[:self.digits]
+
+    def namespace_for(self, metadata):
+        return self.namespace_for_sich(metadata.get("sich"))
+
+    def owns(self, namespace):
+        return namespace.startswith(self._prefix())
+
+    def namespaces_for_query(self, available, sich=None, year_range=None):
+        if sich:
+            return [self.namespace_for_sich(sich)]
+        return [ns for ns in available() if self.owns(ns)]
+
+
+class YearRangePartitioner(NamespacePartitioner):
+    """
+    One namespace per block of `span` years, e.g. "patents-years-2000-2004".
+    The year is read from the first of `year_fields` present in the metadata
+    ("date" for reports, "filing_year" for patents). Documents with no usable
+    year go to "<prefix>-years-unknown".
+    """
+
+    strategy = "year"
+
+    def __init__(self, namespace="", span=5, year_fields=("date", "filing_year")):
+        """
+        Args:
+            namespace (str): Prefix for the generated namespaces.
+            span (int): Number of years per partition.
+            year_fields (list): Metadata keys holding the year, tried in order.
+        """
+        NamespacePartitioner.__init__(self, namespace)
+        self.span = span
+        if isinstance(year_fields, str):
+            year_fields = [year_fields]
+        self.year_fields = list(year_fields)
+
+    def describe(self):
+        return {
+            "strategy": self.strategy,
+            "namespace": self.namespace,
+            "span": self.span,
+            "year_fields": self.year_fields,
+        }
+
+    def _prefix(self):
+        return self.namespace + "-years-"
+
+    def namespace_for_year(self, year):
+        start = int(year) - int(year) % self.span
+        return self._prefix() + str(start) + "-" + str(start + self.span - 1)
+
+    def namespace_for(self, metadata):
+        for field in self.year_fields:
+            try:
+                return self.namespace_for_year(int(metadata.get(field)))
+            except (TypeError, ValueError):
+                continue
+        return self._prefix() + "unknown"
+
+    def owns(self, namespace):
+        return namespace.startswith(self._prefix())
+
+    def namespaces_for_query(self, available, sich=None, year_range=None):
+        namespaces = [ns for ns in available() if self.owns(ns)]
+        if year_range is None:
+            return namespaces
+
+        first, last = year_range
+        selected = []
+        for ns in namespaces:
+            bounds = ns[len(self._prefix()):].split("-")
+            if len(bounds) != 2:
+                # Documents without a year cannot be ruled out by an open range.
+                if first is None or last is None:
+                    selected.append(ns)
+                continue
+            start, end = int(bounds[0]), int(bounds[1])
+            if first is not None and end < first:
+                continue
+            if last is not None and start > last:
+                continue
+            selected.append(ns)
+        return selected
+
+
+PARTITIONERS = {
+    NamespacePartitioner.strategy: NamespacePartitioner,
+    SichPartitioner.strategy: SichPartitioner,
+    YearRangePartitioner.strategy: YearRangePartitioner,
+}
+
+
+def build_partitioner(strategy, namespace, **kwargs):
+    """
+    Creates a partitioner by strategy name ("none", "sich" or "year").
+
+    Args:
+        strategy (str): Strategy name.
+        namespace (str): Namespace, or namespace prefix for partitioned strategies.
+        **kwargs: Extra arguments for the partitioner (digits, span, year_fields).
+    """
+    if strategy not in PARTITIONERS:
+        raise ValueError("Unknown partition strategy: " + str(strategy))
+    return PARTITIONERS[strategy](namespace, **kwargs)
@@ -0,0 +1,125 @@
+"""
+pinecone_pool.py
+
+Process-wide pool of Pinecone clients, index descriptors and index handles.
+
+Creating a Pinecone client or looking up an index host costs a control-plane
+round trip. Every VectorStoreManager (and main.py) shares the objects cached
+here instead of building their own.
+"""
+
+import time
+import threading
+
+from pinecone import Pinecone
+
+_lock = threading.RLock()
+_clients = {}
+_index_names = {}
+_descriptors = {}
+_indexes = {}
+_namespaces = {}
+
+
+def get_client(api_key):
+    """
+    Returns the shared Pinecone client for an API key, creating it on first use.
+    """
+    with _lock:
+        if api_key not in _clients:
+            _clients[api_key] = Pinecone(api_key=api_key)
+        return _clients[api_key]
+
+
+def list_index_names(api_key, refresh=False):
+    """
+    Returns the names of existing indexes, cached after the first call.
+
+    Args:
+        api_key (str): Pinecone API key.
+        refresh (bool): Query Pinecone again instead of using the cache.
+    """
+    with _lock:
+        if refresh or api_key not in _index_names:
+            _index_names[api_key] = list(get_client(api_key).list_indexes().names())
+        return _index_names[api_key]
+
+
+def describe_index(api_key, index_name, refresh=False):
+    """
+    Returns the cached index description (host, dimension, status, ...).
+
+    Args:
+        api_key (str): Pinecone API key.
+        index_name (str): Name of the index.
+        refresh (bool): Query Pinecone again instead of using the cache.
+    """
+    key = (api_key, index_name)
+    with _lock:
+        if refresh or key not in _descriptors:
+            _descriptors[key] = get_client(api_key).describe_index(index_name)
+        return _descriptors[key]
+
+
+def get_index(api_key, index_name):
+    """
+    Returns a shared data-plane handle for an index. The cached descriptor's
+    host is passed in so the handle does not trigger another describe call.
+    """
+    key = (api_key, index_name)
+    with _lock:
+        if key not in _indexes:
+            host = describe_index(api_key, index_name).host
+            _indexes[key] = get_client(api_key).Index(name=index_name, host=host)
+        return _indexes[key]
+
+
+def list_namespaces(api_key, index_name, refresh=False, max_age=None):
+    """
+    Returns the namespaces present in an index, cached so partition fan-out
+    does not call describe_index_stats() on every query. Namespaces created
+    by other processes or hosts only show up once the cache is refreshed, so
+    callers should pass a `max_age`.
+
+    Args:
+        api_key (str): Pinecone API key.
+        index_name (str): Name of the index.
+        refresh (bool): Query Pinecone again instead of using the cache.
+        max_age (float, optional): Maximum age of the cached list in seconds.
+            None keeps it until it is invalidated.
+    """
+    key = (api_key, index_name)
+    with _lock:
+        cached = _namespaces.get(key)
+        if (refresh or cached is None
+                or (max_age is not None and time.time() - cached[0] > max_age)):
+            stats = get_index(api_key, index_name).describe_index_stats()
+            cached = (time.time(), list(stats.namespaces.keys()))
+            _namespaces[key] = cached
+        return list(cached[1])
+
+
+def note_namespaces(api_key, index_name, namespaces):
+    """
+    Records namespaces that were just written to. If any of them is missing
+    from the cached namespace list, the list is dropped and fetched again on
+    the next query.
+    """
+    key = (api_key, index_name)
+    with _lock:
+        cached = _namespaces.get(key)
+        if cached is not None and not set(namespaces).issubset(cached[1]):
+            _namespaces.pop(key, None)
+
+
+def invalidate(api_key, index_name=None):
+    """
+    Drops cached index names, and optionally the descriptor and handle of one
+    index. Call after creating or deleting indexes.
+    """
+    with _lock:
+        _index_names.pop(api_key, None)
+        if index_name is not None:
+            _descriptors.pop((api_key, index_name), None)
+            _indexes.pop((api_key, index_name), None)
+            _namespaces.pop((api_key, index_name), None)
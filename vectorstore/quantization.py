@@ -0,0 +1,476 @@
+"""
+quantization.py
+
+Compressed local storage for embedding vectors.
+
+Vectors are kept in memory only as compact codes (8-bit scalar quantization
+or product quantization). Searches run over the codes first and the best
+candidates are then rescored exactly against the full-precision vectors,
+which stay on disk in a memory-mapped float32 file.
+"""
+
+import os
+import json
+import numpy as np
+
+
+def _normalize(vectors):
+    """
+    L2-normalizes a 2-D array of vectors so that inner product equals cosine
+    similarity (the metric used by the Pinecone index).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, k):
+    """
+    Returns the indices of the k highest scores, ordered best first.
+    """
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class ScalarQuantizer(object):
+    """
+    8-bit scalar quantizer. Each dimension is mapped linearly from the
+    [min, max] range observed in the training sample onto 256 levels,
+    giving one byte per dimension (4x smaller than float32).
+    """
+
+    kind = "scalar"
+
+    def __init__(self):
+        self.minimum = None
+        self.scale = None
+
+    @property
+    def is_trained(self):
+        return self.minimum is not None
+
+    def code_size(self, dimension):
+        """
+        Returns the number of bytes used to store one encoded vector.
+        """
+        return dimension
+
+    def train(self, sample):
+        """
+        Learns the per-dimension value range from a sample of vectors.
+
+        Args:
+            sample (np.ndarray): Array of shape (n, dimension).
+        """
+        sample = np.asarray(sample, dtype=np.float32)
+        self.minimum = sample.min(axis=0)
+        maximum = sample.max(axis=0)
+        scale = (maximum - self.minimum) / 255.0
+        scale[scale == 0] = 1.0
+        self.scale = scale.astype(np.float32)
+
+    def encode(self, vectors):
+        """
+        Encodes vectors into uint8 codes of shape (n, dimension).
+        """
+        codes = np.rint((vectors - self.minimum) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def decode(self, codes):
+        """
+        Reconstructs approximate float32 vectors from codes.
+        """
+        return self.minimum + codes.astype(np.float32) * self.scale
+
+    def score(self, codes, query):
+        """
+        Approximate inner products between a query and every encoded vector.
+        Uses q . (min + c * scale) = q . min + (q * scale) . c so the codes
+        never need to be decoded. Codes are processed in blocks to bound the
+        size of the temporary float32 copy.
+        """
+        offset = float(np.dot(query, self.minimum))
+        weights = (query * self.scale).astype(np.float32)
+        scores = np.zeros(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], 65536):
+            block = codes[start:start + 65536].astype(np.float32)
+            scores[start:start + 65536] = block.dot(weights)
+        return scores + offset
+
+    def get_state(self):
+        return {"minimum": self.minimum, "scale": self.scale}
+
+    def set_state(self, state):
+        self.minimum = state["minimum"].astype(np.float32)
+        self.scale = state["scale"].astype(np.float32)
+
+
+class ProductQuantizer(object):
+    """
+    Product quantizer. Vectors are split into `num_subvectors` contiguous
+    blocks, and each block is replaced by the index of its nearest centroid
+    in a per-block codebook of 256 entries learned with k-means. With 1024
+    dimensions and 128 sub-vectors each vector takes 128 bytes (32x smaller
+    than float32).
+    """
+
+    kind = "product"
+
+    def __init__(self, num_subvectors=128, num_iterations=20, seed=0):
+        """
+        Args:
+            num_subvectors (int): Number of blocks (bytes per encoded vector).
+            num_iterations (int): K-means iterations used when training codebooks.
+            seed (int): Random seed for centroid initialization.
+        """
+        self.num_subvectors = num_subvectors
+        self.num_centroids = 256
+        self.num_iterations = num_iterations
+        self.seed = seed
+        self.codebooks = None
+
+    @property
+    def is_trained(self):
+        return self.codebooks is not None
+
+    def code_size(self, dimension):
+        """
+        Returns the number of bytes used to store one encoded vector.
+        """
+        return self.num_subvectors
+
+    def _split(self, vectors):
+        n, dimension = vectors.shape
+        if dimension % self.num_subvectors != 0:
+            raise ValueError(
+                "Dimension " + str(dimension) + " is not divisible by num_subvectors="
+                + str(self.num_subvectors))
+        return vectors.reshape(n, self.num_subvectors, dimension // self.num_subvectors)
+
+    @staticmethod
+    def _assign(block, centroids):
+        # Squared distances without materializing (n, k, d).
+        distances = (
+            (block ** 2).sum(axis=1, keepdims=True)
+            - 2.0 * block.dot(centroids.T)
+            + (centroids ** 2).sum(axis=1)
+        )
+        return distances.argmin(axis=1)
+
+    def train(self, sample):
+        """
+        Learns one k-means codebook per sub-vector block from a sample.
+
+        Args:
+            sample (np.ndarray): Array of shape (n, dimension). Should contain
+                at least 256 vectors; a few tens of thousands is typical.
+        """
+        sample = np.asarray(sample, dtype=np.float32)
+        blocks = self._split(sample)
+        n = blocks.shape[0]
+        k = min(self.num_centroids, n)
+        rng = np.random.RandomState(self.seed)
+
+        codebooks = np.zeros(
+            (self.num_subvectors, self.num_centroids, blocks.shape[2]), dtype=np.float32)
+        for m in range(self.num_subvectors):
+            block = blocks[:, m, :]
+            centroids = block[rng.choice(n, k, replace=False)].copy()
+            for _ in range(self.num_iterations):
+                assignment = self._assign(block, centroids)
+                counts = np.bincount(assignment, minlength=k)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, block)
+                non_empty = counts > 0
+                centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+                # Re-seed empty clusters from random sample points.
+                empty = np.where(~non_empty)[0]
+                if len(empty):
+                    centroids[empty] = block[rng.choice(n, len(empty))]
+            codebooks[m, :k] = centroids
+            if k < self.num_centroids:
+                codebooks[m, k:] = centroids[0]
+        self.codebooks = codebooks
+
+    def encode(self, vectors):
+        """
+        Encodes vectors into uint8 codes of shape (n, num_subvectors).
+        """
+        blocks = self._split(np.asarray(vectors, dtype=np.float32))
+        codes = np.zeros((blocks.shape[0], self.num_subvectors), dtype=np.uint8)
+        for m in range(self.num_subvectors):
+            codes[:, m] = self._assign(blocks[:, m, :], self.codebooks[m])
+        return codes
+
+    def decode(self, codes):
+        """
+        Reconstructs approximate float32 vectors from codes.
+        """
+        parts = [self.codebooks[m][codes[:, m]] for m in range(self.num_subvectors)]
+        return np.concatenate(parts, axis=1)
+
+    def score(self, codes, query):
+        """
+        Approximate inner products using asymmetric distance computation:
+        a (num_subvectors, 256) lookup table of query-block . centroid
+        products is built once and summed over each code.
+        """
+        query_blocks = query.reshape(self.num_subvectors, -1)
+        table = np.einsum("md,mkd->mk", query_blocks, self.codebooks)
+        scores = np.zeros(codes.shape[0], dtype=np.float32)
+        for m in range(self.num_subvectors):
+            scores += table[m][codes[:, m]]
+        return scores
+
+    def get_state(self):
+        return {
+            "codebooks": self.codebooks,
+            "num_subvectors": np.array(self.num_subvectors),
+        }
+
+    def set_state(self, state):
+        self.codebooks = state["codebooks"].astype(np.float32)
+        self.num_subvectors = int(state["num_subvectors"])
+
+
+QUANTIZERS = {
+    ScalarQuantizer.kind: ScalarQuantizer,
+    ProductQuantizer.kind: ProductQuantizer,
+}
+
+
+class QuantizedVectorStore(object):
+    """
+    Local vector store holding quantized codes in memory and full-precision
+    vectors on disk, including:
+      - Training the quantizer from a sample of vectors
+      - Appending vectors in batches
+      - Approximate search over codes with exact rescoring from disk
+      - Reporting memory savings and recall against exact search
+    """
+
+    VECTORS_FILE = "vectors.f32"
+    CODES_FILE = "codes.npy"
+    IDS_FILE = "ids.json"
+    QUANTIZER_FILE = "quantizer.npz"
+
+    def __init__(self, directory, dimension, quantizer=None):
+        """
+        Args:
+            directory (str): Directory holding the on-disk vectors and codes.
+            dimension (int): Embedding dimension (e.g. 1024 for multilingual-e5-large).
+            quantizer: A ScalarQuantizer or ProductQuantizer. Defaults to ScalarQuantizer.
+        """
+        self.directory = directory
+        self.dimension = dimension
+        if quantizer is None:
+            quantizer = ScalarQuantizer()
+        self.quantizer = quantizer
+
+        self.ids = []
+        self.codes = np.zeros((0, quantizer.code_size(dimension)), dtype=np.uint8)
+        self._pending_codes = []
+        self._vectors = None
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    @property
+    def vectors_path(self):
+        return os.path.join(self.directory, self.VECTORS_FILE)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def train(self, sample):
+        """
+        Trains the quantizer from a sample of (unnormalized) vectors.
+
+        Args:
+            sample (array-like): Array of shape (n, dimension).
+        """
+        self.quantizer.train(_normalize(sample))
+
+    def add(self, vectors, ids):
+        """
+        Appends vectors to the store. Full-precision vectors are written to
+        disk; only their codes are kept in memory.
+
+        Args:
+            vectors (array-like): Array of shape (n, dimension).
+            ids (list): List of n vector IDs.
+        """
+        if not self.quantizer.is_trained:
+            raise ValueError("Quantizer is not trained. Call train() first.")
+
+        vectors = _normalize(vectors)
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(
+                "Expected vectors of dimension " + str(self.dimension)
+                + ", got " + str(vectors.shape[1]))
+        if len(ids) != vectors.shape[0]:
+            raise ValueError("Number of ids does not match number of vectors.")
+
+        # The first batch starts a fresh vector file.
+        mode = "ab" if self.ids else "wb"
+        with open(self.vectors_path, mode) as f:
+            vectors.tofile(f)
+        self._pending_codes.append(self.quantizer.encode(vectors))
+        self.ids.extend(ids)
+        self._vectors = None
+
+    def _flush(self):
+        if self._pending_codes:
+            self.codes = np.concatenate([self.codes] + self._pending_codes, axis=0)
+            self._pending_codes = []
+
+    def _full_vectors(self):
+        if self._vectors is None:
+            self._vectors = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r",
+                shape=(len(self.ids), self.dimension))
+        return self._vectors
+
+    def save(self):
+        """
+        Persists codes, IDs and quantizer parameters next to the vector file.
+        """
+        self._flush()
+        np.save(os.path.join(self.directory, self.CODES_FILE), self.codes)
+        with open(os.path.join(self.directory, self.IDS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"dimension": self.dimension, "ids": self.ids}, f)
+
+        state = dict(self.quantizer.get_state())
+        state["kind"] = np.array(self.quantizer.kind)
+        np.savez(os.path.join(self.directory, self.QUANTIZER_FILE), **state)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Loads a store previously written with save().
+
+        Args:
+            directory (str): Directory passed to the original store.
+
+        Returns:
+            QuantizedVectorStore
+        """
+        ids_path = os.path.join(directory, cls.IDS_FILE)
+        if not os.path.exists(ids_path):
+            raise ValueError("No quantized vector store found in " + directory)
+
+        state = np.load(os.path.join(directory, cls.QUANTIZER_FILE))
+        quantizer = QUANTIZERS[str(state["kind"])]()
+        quantizer.set_state(state)
+
+        with open(ids_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        store = cls(directory, meta["dimension"], quantizer=quantizer)
+        store.ids = meta["ids"]
+        store.codes = np.load(os.path.join(directory, cls.CODES_FILE))
+        return store
+
+    def search(self, query, k=10, num_candidates=100):
+        """
+        Approximate search over the codes, followed by exact rescoring of the
+        top `num_candidates` against the full-precision vectors on disk.
+
+        Args:
+            query (array-like): Query vector of shape (dimension,).
+            k (int): Number of results to return.
+            num_candidates (int): Number of approximate hits to rescore.
+
+        Returns:
+            list: (id, cosine_similarity) tuples, best first.
+        """
+        self._flush()
+        if len(self.ids) == 0:
+            return []
+        query = _normalize(query)[0]
+        approximate = self.quantizer.score(self.codes, query)
+        candidates = _top_k(approximate, max(k, num_candidates))
+
+        # Sorted row order keeps the memmap reads sequential.
+        rows = np.sort(candidates)
+        exact = self._full_vectors()[rows].dot(query)
+        order = _top_k(exact, k)
+        return [(self.ids[rows[i]], float(exact[i])) for i in order]
+
+    def exact_search(self, query, k=10, batch_size=65536):
+        """
+        Brute-force search over the full-precision vectors on disk.
+
+        Args:
+            query (array-like): Query vector of shape (dimension,).
+            k (int): Number of results to return.
+            batch_size (int): Number of vectors read from disk per step.
+
+        Returns:
+            list: (id, cosine_similarity) tuples, best first.
+        """
+        self._flush()
+        if len(self.ids) == 0:
+            return []
+        query = _normalize(query)[0]
+        vectors = self._full_vectors()
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), batch_size):
+            scores[start:start + batch_size] = vectors[start:start + batch_size].dot(query)
+        return [(self.ids[i], float(scores[i])) for i in _top_k(scores, k)]
+
+    def memory_report(self):
+        """
+        Returns:
+            dict: Bytes used by in-memory codes versus full float32 vectors,
+                and the resulting compression ratio.
+        """
+        self._flush()
+        code_bytes = self.quantizer.code_size(self.dimension)
+        full_bytes = self.dimension * 4
+        return {
+            "num_vectors": len(self.ids),
+            "bytes_per_vector": code_bytes,
+            "full_bytes_per_vector": full_bytes,
+            "code_bytes": int(self.codes.nbytes),
+            "full_bytes": len(self.ids) * full_bytes,
+            "compression_ratio": float(full_bytes) / code_bytes,
+        }
+
+    def evaluate_recall(self, queries, k=10, num_candidates=100):
+        """
+        Measures recall@k of search() against exact_search() on sample queries.
+
+        Args:
+            queries (array-like): Array of shape (n, dimension).
+            k (int): Number of neighbours compared per query.
+            num_candidates (int): Candidates rescored per query.
+
+        Returns:
+            dict: recall@k with and without rescoring plus the memory report.
+        """
+        self._flush()
+        queries = _normalize(queries)
+        hits = 0
+        hits_no_rescore = 0
+        total = 0
+        for query in queries:
+            truth = set(i for i, _ in self.exact_search(query, k))
+            found = set(i for i, _ in self.search(query, k, num_candidates))
+            approximate = _top_k(self.quantizer.score(self.codes, query), k)
+            hits += len(truth & found)
+            hits_no_rescore += len(truth & set(self.ids[i] for i in approximate))
+            total += len(truth)
+
+        report = self.memory_report()
+        report["k"] = k
+        report["num_candidates"] = num_candidates
+        report["recall_at_k"] = float(hits) / total if total else 0.0
+        report["recall_at_k_without_rescoring"] = float(hits_no_rescore) / total if total else 0.0
+        return report
@@ -7,11 +7,18 @@ Currently configured to use Chroma as the vector database.
 
 import os
 import time
+import heapq
+import random
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from configs.config import Config
 import pinecone
-from pinecone import Pinecone, ServerlessSpec
+from pinecone import ServerlessSpec
 from langchain_pinecone import PineconeEmbeddings, PineconeVectorStore
 from langchain.schema import Document
+from vectorstore import pinecone_pool
+from vectorstore.partitioning import NamespacePartitioner
+from vectorstore.quantization import QuantizedVectorStore
 
 
 class VectorStoreManager(object):
@@ -29,7 +36,9 @@ class VectorStoreManager(object):
             namespace="",
             embeddings_model_name="multilingual-e5-large",
             cloud="",
-            region=""
+            region="",
+            context_cache=None,
+            partitioner=None
     ):
         """
         Args:
@@ -39,6 +48,10 @@ class VectorStoreManager(object):
             embeddings_model_name (str): Name of the embeddings model.
             cloud (str): Cloud provider (e.g., "aws").
             region (str): Cloud region (e.g., "us-east-1").
+            context_cache (ContextCache, optional): Cache of retrieved prompt
+                contexts, invalidated whenever matching documents are upserted.
+            partitioner (NamespacePartitioner, optional): Strategy assigning documents
+                to namespaces. Defaults to a single namespace `namespace`.
         """
         self.index_name = index_name
         self.namespace = namespace
@@ -54,8 +67,12 @@ class VectorStoreManager(object):
         env = os.environ.get('PINECONE_ENVIRONMENT', 'us-east1-gcp')
         os.environ["PINECONE_ENVIRONMENT"] = env
 
-        # Create a Pinecone client instance.
-        self.pc = Pinecone(api_key=self.pinecone_api_key)
+        # Share one Pinecone client per API key across all managers.
+        self.pc = pinecone_pool.get_client(self.pinecone_api_key)
+
+        if partitioner is None:
+            partitioner = NamespacePartitioner(namespace)
+        self.partitioner = partitioner
 
         # Initialize the embedding function using Pinecone's hosted model.
         self.embedding_function = PineconeEmbeddings(
@@ -74,19 +91,22 @@ class VectorStoreManager(object):
                 raise ValueError("Unable to determine embedding dimension for model " + embeddings_model_name)
 
         self.vectorstore = None
+        self.context_cache = context_cache
+        self._namespace_stores = {}
 
 
-    def create_vectorstore(self, documents):
+    def create_vectorstore(self, documents, ids=None):
         """
         Creates a new Pinecone vector store from the given documents.
         This includes creating the index (if it doesn't exist) and upserting embeddings.
 
         Args:
             documents (list): List of LangChain Document objects.
+            ids (list, optional): Vector IDs, one per document (see upsert_documents()).
         """
         spec = ServerlessSpec(cloud=self.cloud, region=self.region)
 
-        if self.index_name not in self.pc.list_indexes().names():
+        if self.index_name not in pinecone_pool.list_index_names(self.pinecone_api_key, refresh=True):
             print(
                 f"Index '{self.index_name}' does not exist. Creating new index...")
             self.pc.create_index(
@@ -96,16 +116,14 @@ class VectorStoreManager(object):
                 spec=spec
             )
             # Wait until the index is ready.
-            while not self.pc.describe_index(self.index_name).status['ready']:
+            while not pinecone_pool.describe_index(
+                    self.pinecone_api_key, self.index_name, refresh=True).status['ready']:
                 time.sleep(1)
+            pinecone_pool.invalidate(self.pinecone_api_key)
             print("Index created.")
 
-        self.vectorstore = PineconeVectorStore.from_documents(
-            documents=documents,
-            index_name=self.index_name,
-            embedding=self.embedding_function,
-            namespace=self.namespace
-        )
+        self.vectorstore = self.get_namespace_store(self.namespace)
+        self.upsert_documents(documents, ids=ids)
 
 
     def load_vectorstore(self):
@@ -113,17 +131,42 @@ class VectorStoreManager(object):
         Loads the Chroma vector store from an existing directory (self.persist_directory).
         Raises an error if the directory does not exist or is invalid.
         """
-        # Create a Pinecone client instance.
-        pc = Pinecone(api_key=self.pinecone_api_key)
-        if self.index_name not in pc.list_indexes().names():
+        if self.index_name not in pinecone_pool.list_index_names(self.pinecone_api_key):
             raise ValueError(
                 f"Index '{self.index_name}' does not exist in Pinecone. Nothing to load.")
 
-        self.vectorstore = PineconeVectorStore.from_existing_index(
-            index_name=self.index_name,
-            embedding=self.embedding_function,
-            namespace=self.namespace
-        )
+        self.vectorstore = self.get_namespace_store(self.namespace)
+
+    def get_namespace_store(self, namespace):
+        """
+        Returns a PineconeVectorStore bound to one namespace, built on the pooled
+        index handle and cached per namespace.
+
+        Args:
+            namespace (str): Namespace within the index.
+        """
+        if namespace not in self._namespace_stores:
+            self._namespace_stores[namespace] = PineconeVectorStore(
+                index=pinecone_pool.get_index(self.pinecone_api_key, self.index_name),
+                embedding=self.embedding_function,
+                namespace=namespace
+            )
+        return self._namespace_stores[namespace]
+
+    def list_namespaces(self, refresh=False):
+        """
+        Args:
+            refresh (bool): Query Pinecone instead of the pooled cache. Otherwise
+                the cached list is refreshed once it is older than
+                Config.System.NAMESPACE_CACHE_SECONDS, so partitions created by
+                other ingestion workers are picked up.
+
+        Returns:
+            list: Namespaces currently present in the index.
+        """
+        return pinecone_pool.list_namespaces(
+            self.pinecone_api_key, self.index_name, refresh=refresh,
+            max_age=Config.System.NAMESPACE_CACHE_SECONDS)
 
     def get_retriever(self, search_kwargs=None):
         """
@@ -139,21 +182,258 @@ class VectorStoreManager(object):
         if self.vectorstore is None:
             raise ValueError("Vector store is not initialized. Call create_vectorstore() or load_vectorstore() first.")
 
+        # A retriever is bound to a single namespace, which partitioned strategies never write to.
+        if self.partitioner.strategy != NamespacePartitioner.strategy:
+            raise ValueError(
+                "get_retriever() searches a single namespace, but partition strategy '"
+                + self.partitioner.strategy + "' spreads documents over several. Use query_partitions() instead.")
+
         if search_kwargs is None:
             search_kwargs = {}
         return self.vectorstore.as_retriever(**search_kwargs)
 
-    def upsert_documents(self, documents):
+    def upsert_documents(self, documents, ids=None):
         """
         Upserts new documents into the existing vectorstore.
 
         Args:
             documents (list): List of LangChain Document objects to be added.
+            ids (list, optional): Vector IDs, one per document. Passing stable IDs
+                makes re-ingesting the same documents overwrite rather than duplicate.
         """
         if self.vectorstore is None:
             raise ValueError(
                 "Vector store is not initialized. Call create_vectorstore() or load_vectorstore() first.")
 
-        texts = [doc.page_content for doc in documents]
-        metadatas = [doc.metadata for doc in documents]
-        self.vectorstore.add_texts(texts, metadatas=metadatas)
+        # Group documents by the namespace their partition maps to.
+        groups = {}
+        for i, doc in enumerate(documents):
+            groups.setdefault(self.partitioner.namespace_for(doc.metadata), []).append(i)
+
+        for namespace, positions in groups.items():
+            texts = [documents[i].page_content for i in positions]
+            metadatas = [documents[i].metadata for i in positions]
+            group_ids = None
+            if ids is not None:
+                group_ids = [ids[i] for i in positions]
+            self.get_namespace_store(namespace).add_texts(texts, metadatas=metadatas, ids=group_ids)
+        pinecone_pool.note_namespaces(self.pinecone_api_key, self.index_name, list(groups.keys()))
+
+        # Contexts built from the old set of documents for these firms/industries are stale.
+        if self.context_cache is not None:
+            removed = self.context_cache.invalidate_for_documents(documents)
+            if removed:
+                print("Invalidated " + str(removed) + " cached contexts.")
+
+    def query_partitions(self, query, k=10, sich=None, year_range=None, filter=None, max_workers=8,
+                         embedding=None):
+        """
+        Searches every partition relevant to the query in parallel and merges
+        the per-partition results into a single top-k list. The query is
+        embedded once and shared by all partitions.
+
+        Args:
+            query (str): Query text.
+            k (int): Number of results to return.
+            sich (str, optional): Restrict to one industry's partition (SICH strategy).
+            year_range (tuple, optional): (first_year, last_year) used to select
+                partitions (year strategy); either bound may be None.
+            filter (dict, optional): Pinecone metadata filter applied in every partition.
+            max_workers (int): Maximum number of partitions queried concurrently.
+            embedding (list, optional): Precomputed query embedding, to share one
+                embedding between several calls with the same query.
+
+        Returns:
+            list: (Document, score) tuples, best first.
+        """
+        if self.vectorstore is None:
+            raise ValueError("Vector store is not initialized. Call create_vectorstore() or load_vectorstore() first.")
+
+        namespaces = self.partitioner.namespaces_for_query(
+            self.list_namespaces, sich=sich, year_range=year_range)
+        if not namespaces:
+            return []
+
+        if embedding is None:
+            embedding = self.embedding_function.embed_query(query)
+
+        def search(namespace):
+            return self.get_namespace_store(namespace).similarity_search_by_vector_with_score(
+                embedding, k=k, filter=filter)
+
+        if len(namespaces) == 1:
+            results = [search(namespaces[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(namespaces))) as executor:
+                results = list(executor.map(search, namespaces))
+
+        merged = [item for partition in results for item in partition]
+        return heapq.nlargest(k, merged, key=lambda item: item[1])
+
+    def retrieve_context(self, cik, sich, fyear, query=None, k=None):
+        """
+        Retrieves the {context} and {context_same_SICH} values of PROMPT_TEMPLATE
+        for one firm-year: past reports of the company itself, and past reports
+        of other companies with the same SICH. Results are served from
+        `context_cache` when available so repeated prompts for the same
+        firm-year skip retrieval entirely.
+
+        Args:
+            cik (str): Company CIK.
+            sich (str): Company SICH code (None or "" skips the industry context).
+            fyear (int): Current fiscal year; only earlier reports are used.
+            query (str): Retrieval query. Defaults to Config.Project.CONTEXT_QUERY.
+            k (int): Number of chunks per context. Defaults to Config.Project.CONTEXT_K.
+
+        Returns:
+            dict: Keys "context", "context_same_SICH", "chunk_ids" and "sich_chunk_ids".
+        """
+        if self.vectorstore is None:
+            raise ValueError("Vector store is not initialized. Call create_vectorstore() or load_vectorstore() first.")
+
+        if query is None:
+            query = Config.Project.CONTEXT_QUERY
+        if k is None:
+            k = Config.Project.CONTEXT_K
+        cik = str(cik)
+        sich = str(sich or "")
+        fyear = int(fyear)
+        params = {"query": query, "k": k, "partitioning": self.partitioner.describe()}
+
+        generation = None
+        if self.context_cache is not None:
+            cached = self.context_cache.get(cik, sich, fyear, params)
+            if cached is not None:
+                return cached
+            # Read before retrieving so an upsert that lands mid-retrieval blocks the put.
+            generation = self.context_cache.generation(cik, sich)
+
+        year_range = (None, fyear - 1)
+        embedding = self.embedding_function.embed_query(query)
+        docs = [d for d, _ in self.query_partitions(
+            query, k=k, sich=sich or None, year_range=year_range,
+            filter={"cik": {"$eq": cik}, "date": {"$lt": fyear}}, embedding=embedding)]
+        sich_docs = []
+        if sich:
+            sich_docs = [d for d, _ in self.query_partitions(
+                query, k=k, sich=sich, year_range=year_range, embedding=embedding,
+                filter={"sich": {"$eq": sich}, "cik": {"$ne": cik}, "date": {"$lt": fyear}})]
+
+        result = {
+            "chunk_ids": [getattr(d, "id", None) for d in docs],
+            "context": "\n\n".join(d.page_content for d in docs),
+            "sich_chunk_ids": [getattr(d, "id", None) for d in sich_docs],
+            "context_same_SICH": "\n\n".join(d.page_content for d in sich_docs),
+        }
+        if self.context_cache is not None:
+            self.context_cache.put(
+                cik, sich, fyear, params,
+                result["chunk_ids"], result["context"],
+                result["sich_chunk_ids"], result["context_same_SICH"],
+                generation=generation
+            )
+        return result
+
+    def export_quantized_store(self, directory, quantizer=None, sample_size=None, batch_size=100, seed=0,
+                               num_recall_queries=100, k=10):
+        """
+        Copies every vector in the manager's partitions into a local QuantizedVectorStore.
+        The quantizer is trained on `sample_size` vectors drawn uniformly from all
+        partitions (reservoir sampling over the listed IDs, so only IDs are held
+        while sampling), after which all vectors are encoded in batches.
+        Full-precision vectors are written to `directory` and only the compact
+        codes are held in memory. Recall@k against exact search is then
+        measured on a slice of the sample held out from training and printed.
+
+        Args:
+            directory (str): Output directory for the quantized store.
+            quantizer: ScalarQuantizer or ProductQuantizer (defaults to 8-bit scalar).
+            sample_size (int): Number of vectors used to train the quantizer.
+                Defaults to Config.Project.QUANTIZATION_SAMPLE_SIZE.
+            batch_size (int): Number of IDs fetched from Pinecone per request.
+            seed (int): Random seed for the training sample.
+            num_recall_queries (int): Sampled vectors held out from training and
+                used as queries for the recall report (at most a tenth of the sample).
+            k (int): Number of neighbours compared in the recall report.
+
+        Returns:
+            QuantizedVectorStore: The saved store.
+        """
+        if sample_size is None:
+            sample_size = Config.Project.QUANTIZATION_SAMPLE_SIZE
+
+        index = pinecone_pool.get_index(self.pinecone_api_key, self.index_name)
+        store = QuantizedVectorStore(directory, self.embedding_dimension, quantizer=quantizer)
+
+        # Pass 1: reservoir-sample (namespace, id) pairs across every partition.
+        rng = random.Random(seed)
+        reservoir = []
+        seen = 0
+        for namespace, ids in self._iterate_ids(index, batch_size):
+            for vector_id in ids:
+                seen += 1
+                if len(reservoir) < sample_size:
+                    reservoir.append((namespace, vector_id))
+                else:
+                    slot = rng.randrange(seen)
+                    if slot < sample_size:
+                        reservoir[slot] = (namespace, vector_id)
+        if not reservoir:
+            raise ValueError("No vectors found in index '" + self.index_name + "' to export.")
+
+        by_namespace = {}
+        for namespace, vector_id in reservoir:
+            by_namespace.setdefault(namespace, []).append(vector_id)
+
+        sample = np.zeros((len(reservoir), self.embedding_dimension), dtype=np.float32)
+        filled = 0
+        for namespace, sample_ids in by_namespace.items():
+            for start in range(0, len(sample_ids), batch_size):
+                _, vectors = self._fetch_batch(index, namespace, sample_ids[start:start + batch_size])
+                sample[filled:filled + len(vectors)] = vectors
+                filled += len(vectors)
+        num_queries = min(num_recall_queries, filled // 10)
+        queries = sample[:num_queries].copy()
+        store.train(sample[num_queries:filled])
+        del sample
+        print("Trained quantizer on " + str(filled - num_queries) + " of " + str(seen) + " vectors.")
+
+        # Pass 2: encode every vector.
+        for namespace, ids in self._iterate_ids(index, batch_size):
+            batch_ids, vectors = self._fetch_batch(index, namespace, ids)
+            if batch_ids:
+                store.add(vectors, batch_ids)
+
+        store.save()
+        print("Exported " + str(len(store)) + " vectors to quantized store at " + directory)
+
+        if num_queries:
+            report = store.evaluate_recall(queries, k=k)
+            print(
+                "Recall@" + str(k) + " over " + str(num_queries) + " held-out queries: "
+                + str(round(report["recall_at_k"], 4)) + " with rescoring, "
+                + str(round(report["recall_at_k_without_rescoring"], 4)) + " without; "
+                + str(round(report["compression_ratio"], 1)) + "x smaller than float32.")
+        return store
+
+    def _fetch_batch(self, index, namespace, ids):
+        """
+        Fetches vectors by ID and returns (found ids, float32 array of shape (n, dim)).
+        """
+        fetched = index.fetch(ids=list(ids), namespace=namespace).vectors
+        batch_ids = [i for i in ids if i in fetched]
+        vectors = np.zeros((len(batch_ids), self.embedding_dimension), dtype=np.float32)
+        for row, vector_id in enumerate(batch_ids):
+            vectors[row] = np.asarray(fetched[vector_id].values, dtype=np.float32)
+        return batch_ids, vectors
+
+    def _iterate_ids(self, index, batch_size):
+        """
+        Yields (namespace, id batch) pairs over every partition of this manager.
+        The namespace list is always fetched fresh so an export never misses
+        partitions created since it was cached.
+        """
+        namespaces = self.partitioner.namespaces_for_query(lambda: self.list_namespaces(refresh=True))
+        for namespace in namespaces:
+            for ids in index.list(namespace=namespace, limit=batch_size):
+                yield namespace, ids